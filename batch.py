@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class TokenBucket():
+    """Allows `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+@dataclass
+class ProviderLimit():
+    concurrency: int = 2
+    rate: float = 1.0
+    burst: int = 1
+
+
+DEFAULT_LIMITS = {
+    "pons": ProviderLimit(concurrency=4, rate=2.0, burst=2),
+    "linguee": ProviderLimit(concurrency=2, rate=0.5, burst=1),
+    "webster": ProviderLimit(concurrency=4, rate=2.0, burst=2),
+}
+
+
+class RateGate():
+    """Takes one token of `bucket` for a lookup, on its first request.
+
+    Called from the lookup's threads, the token is awaited on `loop`.
+    """
+
+    def __init__(self, bucket: TokenBucket, loop: asyncio.AbstractEventLoop):
+        self.bucket = bucket
+        self.loop = loop
+        self.acquired = False
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            if not self.acquired:
+                asyncio.run_coroutine_threadsafe(self.bucket.acquire(),
+                                                 self.loop).result()
+                self.acquired = True
+
+
+_gate = contextvars.ContextVar("rate_gate", default=None)
+
+
+def rate_gate():
+    """Wait for the rate limit of the current lookup before a network request.
+
+    Lookups answered from the caches never get here and aren't throttled.
+    """
+    if (gate := _gate.get()) is not None:
+        gate()
+
+
+class ProviderLimiter():
+    """Runs blocking provider calls in threads under a concurrency cap and
+    a token-bucket rate limit on their network requests."""
+
+    def __init__(self, limit: ProviderLimit):
+        self.semaphore = asyncio.Semaphore(limit.concurrency)
+        self.bucket = TokenBucket(limit.rate, limit.burst)
+
+    async def run(self, func: Callable, *args, **kwargs):
+        gate = RateGate(self.bucket, asyncio.get_running_loop())
+
+        def call():
+            _gate.set(gate)
+            return func(*args, **kwargs)
+
+        async with self.semaphore:
+            return await asyncio.to_thread(call)
+
+
+def get_limiters(providers, limits: Optional[Dict[str, ProviderLimit]] = None):
+    limits = {**DEFAULT_LIMITS, **(limits or {})}
+    return {p: ProviderLimiter(limits.get(p, ProviderLimit()))
+            for p in providers}
+
+
+def run_coroutine(coro: Awaitable):
+    """`asyncio.run`, also from code already inside an event loop such as a
+    notebook, where the coroutine gets a loop in a helper thread."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coro).result()
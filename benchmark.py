@@ -0,0 +1,424 @@
+"""Offline micro-benchmarks for the entry layer. Run `python benchmark.py`."""
+import json
+import re
+import subprocess
+import sys
+import timeit
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+import mw_markup
+from dict_entry import SingleEntry
+from linguee import LingueeEntries
+from pons import PonsEntries
+from webster import WebsterEntries
+
+import warnings
+warnings.filterwarnings("ignore")
+
+
+def load_linguee(path: str = "fixtures/linguee_run.json", word: str = "run",
+                 src_lang: str = "en", dst_lang: str = "de",
+                 cls=LingueeEntries, repeat: int = 1):
+    """Build LingueeEntries from a recorded API response without network.
+
+    `repeat` concatenates the payload with itself to mimic large responses.
+    """
+    with open(path) as f:
+        payload = json.load(f) * repeat
+    entries = cls.__new__(cls)
+    entries.word = word
+    entries.lang_pool = [src_lang, dst_lang]
+    entries.entries, entries.error = payload, None
+    entries.langs = [entries._get_lang(x) for x in entries.entries]
+    entries._init_processed()
+    entries.process_entries()
+    return entries
+
+
+def load_pons(path: str = "fixtures/pons_spiel.json", word: str = "Spiel",
+              src_lang: str = "de", dst_lang: str = "en", cls=PonsEntries):
+    """Build PonsEntries from a recorded API response without network."""
+    with open(path) as f:
+        payload = json.load(f)
+    entries = cls.__new__(cls)
+    entries.word = word
+    entries.lang_pair = f"{src_lang}-{dst_lang}"
+    entries.entries = payload
+    entries.langs = [x["lang"] for x in entries.entries]
+    entries._init_processed()
+    entries.process_entries()
+    return entries
+
+
+class FixtureWebsterEntries(WebsterEntries):
+    """WebsterEntries reading recorded responses instead of the API."""
+
+    def __init__(self, word: str, payloads: tuple):
+        self.payloads = payloads
+        super().__init__(word)
+
+    def get_entries(self):
+        return self.payloads
+
+
+def load_webster(path: str = "fixtures/webster_run.json",
+                 thesaurus_path: str = "fixtures/thesaurus_run.json",
+                 word: str = "run"):
+    """Build WebsterEntries from recorded API responses without network."""
+    with open(path) as f, open(thesaurus_path) as t:
+        payloads = json.load(f), json.load(t)
+    return FixtureWebsterEntries(word, payloads)
+
+
+class BsPonsEntries(PonsEntries):
+    """PonsEntries parsing every fragment with BeautifulSoup, as it used to."""
+
+    def process_headword_full(self, lang: str, rom: dict, n: int):
+        hf = rom["headword_full"]
+        hf = BeautifulSoup(hf, features="lxml")
+        if span := hf.find("span", {"class": "flexion"}):
+            flexion = span.text
+        else:
+            flexion = ""
+        if span := hf.find("span", {"class": "phonetics"}):
+            phonetics = span.text
+        else:
+            phonetics = ""
+        if span := hf.find("span", {"class": "genus"}):
+            if acronym := span.find("acronym"):
+                gender = acronym.get("title")
+            else:
+                gender = span.get("title")
+            if not gender:
+                gender = span.text
+        else:
+            gender = ""
+        self.processed_entries[lang]["flexion"].extend([flexion] * n)
+        self.processed_entries[lang]["phonetics"].extend([phonetics] * n)
+        self.processed_entries[lang]["gender_src"].extend([gender] * n)
+
+    def process_type_translation(self, hit, lang, iy):
+        self.process_translation(hit["target"], lang)
+        self.processed_entries[lang]["sense"].append("")
+        self.processed_entries[lang]["examples_src"].append("")
+        self.processed_entries[lang]["examples_dst"].append("")
+
+        headword = BeautifulSoup(hit["source"], features="lxml").text
+        self.processed_entries[lang]["headword"].append(headword)
+        self.processed_entries[lang]["hit"].append(0)
+        self.processed_entries[lang]["flexion"].append("")
+        self.processed_entries[lang]["phonetics"].append("")
+        self.processed_entries[lang]["gender_src"].append("")
+        self.processed_entries[lang]["pos"].append("")
+
+        self.processed_entries[lang]["entry"].append(iy)
+
+    def process_translation(self, trans: str, lang: str, wc: str = ""):
+        trans = BeautifulSoup(trans, features="lxml")
+        target = trans.text
+        gender = ""
+        if wc == "noun" and lang in ["en"]:
+            sp = target.split()
+            target = " ".join(sp[:-1])
+            gender = sp[-1]
+        target_desc = ""
+        if span := trans.find("span"):
+            if acronym := span.get("acronym"):
+                target_desc = acronym.get("title")
+        elif acronym := trans.acronym:
+            target_desc = acronym.get("title")
+        self.processed_entries[lang]["target"].append(target)
+        self.processed_entries[lang]["gender_dst"].append(gender)
+        self.processed_entries[lang]["target_desc"].append(target_desc)
+        return target
+
+    def process_arab(self, lang: str, arab: dict, wc: str):
+        sens = BeautifulSoup(arab["header"], features="lxml")
+        if span := sens.find("span", {"class": "sense"}):
+            sense = span.text
+        else:
+            sense = ""
+        self.processed_entries[lang]["sense"].append(sense)
+        target = self.process_translation(arab["translations"][0]["target"],
+                                          lang,
+                                          wc=wc)
+        examples_src1 = []
+        examples_src2 = []
+        examples_dst1 = []
+        examples_dst2 = []
+        for tran in arab["translations"][1:]:
+            src = BeautifulSoup(tran["source"], features="lxml").text
+            dst = BeautifulSoup(tran["target"], features="lxml").text
+            if target.lower() in [x.lower() for x in dst.split()]:
+                examples_src1.append(src.strip())
+                examples_dst1.append(dst.strip())
+            else:
+                examples_src2.append(src.strip())
+                examples_dst2.append(dst.strip())
+        examples_src = examples_src1 + examples_src2
+        examples_dst = examples_dst1 + examples_dst2
+        self.processed_entries[lang]["examples_src"].append("<br>".join(examples_src[:2]))
+        self.processed_entries[lang]["examples_dst"].append("<br>".join(examples_dst[:2]))
+
+
+class ConcatPonsEntries(PonsEntries):
+    """PonsEntries building its frame with per-POS loops and concats."""
+
+    def _both_empty_and_not(self, series: pd.Series):
+        are_there_nulls = series.isnull().any()
+        are_there_empty_strings = any(series == "")
+        are_there_nulls = are_there_nulls or are_there_empty_strings
+        are_there_values = not series.isnull().all()
+        are_there_value_strings = not all(series == "")
+        are_there_values = are_there_values and are_there_value_strings
+        return are_there_nulls and are_there_values
+
+    def _interpolate(self, series: pd.Series):
+        series.loc[series == ""] = None
+        series.interpolate("pad", inplace=True)
+        return series
+
+    def _interpolate_gf(self, df):
+        pos = df.pos.drop_duplicates().to_list()
+        new_df = pd.DataFrame()
+        for p in pos:
+            df_pos = df.loc[df.pos == p]
+            if self._both_empty_and_not(df_pos.flexion):
+                df_pos.flexion = self._interpolate(df_pos.flexion)
+            if self._both_empty_and_not(df_pos.gender_src):
+                df_pos.gender_src = self._interpolate(df_pos.gender_src)
+            if self._both_empty_and_not(df_pos.gender_dst):
+                df_pos.gender_dst = self._interpolate(df_pos.gender_dst)
+            new_df = pd.concat([new_df, df_pos])
+        return new_df
+
+    def get_df(self):
+        df = pd.DataFrame()
+        for k, v in self.processed_entries.items():
+            df_tmp = pd.DataFrame(v)
+            df_tmp["lang"] = k
+            df = pd.concat([df, df_tmp])
+        if not df.empty:
+            df = self._interpolate_gf(df)
+            df = df.loc[(~pd.isnull(df.target)) & (df.target != "")]
+            return df, None
+        return df, "empty"
+
+
+def check_pons_parity(path: str = "fixtures/pons_spiel.json"):
+    fast = load_pons(path).processed_entries
+    slow = load_pons(path, cls=BsPonsEntries).processed_entries
+    assert fast == slow, "Fragment and BeautifulSoup parsers disagree"
+
+
+def check_pons_df_parity(path: str = "fixtures/pons_spiel.json"):
+    fast, _ = load_pons(path)()
+    slow, _ = load_pons(path, cls=ConcatPonsEntries)()
+    pd.testing.assert_frame_equal(fast, slow)
+
+
+class IterrowsLingueeEntries(LingueeEntries):
+    """LingueeEntries splitting POS and gender row by row."""
+
+    def get_df(self):
+        frames = [pd.DataFrame(v).assign(lang=k)
+                  for k, v in self.processed_entries.items()]
+        df = pd.concat(frames, ignore_index=True)
+        df["gender_src"] = ""
+        df["gender_dst"] = ""
+        for ix, row in df.iterrows():
+            if "," in row.pos:
+                pg = [x.strip() for x in row.pos.split(",")]
+                df.loc[ix, "pos"], df.loc[ix, "gender_src"] = pg
+            if "," in row.pos_dst:
+                pg = [x.strip() for x in row.pos_dst.split(",")]
+                df.loc[ix, "pos_dst"], df.loc[ix, "gender_dst"] = pg
+        return df, self.error
+
+
+def check_linguee_df_parity(path: str = "fixtures/linguee_run.json"):
+    fast, _ = load_linguee(path)()
+    slow, _ = load_linguee(path, cls=IterrowsLingueeEntries)()
+    assert fast.index.is_unique
+    pd.testing.assert_frame_equal(fast, slow)
+
+
+def check_senses_parity():
+    for entries in (load_pons(), load_linguee()):
+        df, error = entries.get_df()
+        senses, senses_error = entries.get_senses()
+        assert error == senses_error
+        pd.testing.assert_frame_equal(df.reset_index(drop=True),
+                                      senses.to_frame())
+
+
+def load_dt_corpus(path: str = "fixtures/webster_dt.json", repeat: int = 1):
+    """Recorded Merriam-Webster definition and example strings."""
+    with open(path) as f:
+        return json.load(f) * repeat
+
+
+def replace_desc(desc: str):
+    """WebsterEntries.process_desc as it used to be, a regex and replaces."""
+    pattern = re.compile(r"{dx_def}.+{/dx_def}")
+    if m := pattern.search(desc):
+        desc = desc.replace(m[0], "")
+    replace_d = {
+        "{wi}": "<i>",
+        "{/wi}": "</i>",
+        "{it}": "<i>",
+        "{/it}": "</i>",
+        "{bc}": "",
+    }
+    for k, v in replace_d.items():
+        desc = desc.replace(k, v)
+    return desc
+
+
+def check_mw_markup_parity(path: str = "fixtures/webster_dt.json"):
+    # The replace chain left every other token in the text.
+    legacy = {"wi", "it", "bc", "dx_def"}
+    for dt in load_dt_corpus(path):
+        tokens = set(re.findall(r"\{/?(\w+)", dt))
+        if tokens <= legacy:
+            assert mw_markup.render(dt) == replace_desc(dt), dt
+
+
+class TextOnlyEntry(SingleEntry):
+    """SingleEntry without image and audio downloads."""
+
+    @property
+    def image(self):
+        return ""
+
+    @property
+    def audio(self):
+        return ""
+
+
+class UnmemoizedEntry(TextOnlyEntry):
+    memoize = False
+
+
+def best_of(func, number: int = 20, repeat: int = 5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def bench_get_dict():
+    df, _ = load_linguee()()
+    results = {}
+    for name, cls in [("unmemoized", UnmemoizedEntry),
+                      ("memoized", TextOnlyEntry)]:
+        def get_dict():
+            cls(word="run", entry=df, pos="verb", src_lang="de",
+                dst_lang="en").get_dict()
+        results[name] = best_of(get_dict)
+    return results
+
+
+def bench_pons_process_entries():
+    check_pons_parity()
+    return {
+        "beautifulsoup": best_of(lambda: load_pons(cls=BsPonsEntries)),
+        "fragment": best_of(lambda: load_pons()),
+    }
+
+
+def bench_pons_get_df():
+    check_pons_df_parity()
+    concat = load_pons(cls=ConcatPonsEntries)
+    grouped = load_pons()
+    return {
+        "concat": best_of(concat.get_df),
+        "grouped": best_of(grouped.get_df),
+    }
+
+
+def bench_linguee_get_df(repeat: int = 50):
+    check_linguee_df_parity()
+    iterrows = load_linguee(cls=IterrowsLingueeEntries, repeat=repeat)
+    vectorized = load_linguee(repeat=repeat)
+    return {
+        "iterrows": best_of(iterrows.get_df, number=2, repeat=3),
+        "vectorized": best_of(vectorized.get_df, number=2, repeat=3),
+    }
+
+
+# Modules each entry point must not import at startup.
+LAZY_MODULES = {
+    "run_webster": ("pons", "linguee", "linguee_backend", "pons_fragment",
+                    "selenium", "bs4", "simple_image_download"),
+    "run_pons_linguee": ("webster", "selenium", "bs4",
+                         "simple_image_download"),
+}
+
+
+def bench_senses():
+    """Provider output to card fields, through a frame or through Senses."""
+    check_senses_parity()
+    entries = load_linguee()
+    def get_dict(emit):
+        return lambda: TextOnlyEntry(word="run", entry=emit()[0], pos="verb",
+                                     src_lang="en", dst_lang="de").get_dict()
+    return {
+        "frame": best_of(get_dict(entries.get_df)),
+        "senses": best_of(get_dict(entries.get_senses)),
+    }
+
+
+def bench_mw_markup(repeat: int = 20):
+    check_mw_markup_parity()
+    corpus = load_dt_corpus(repeat=repeat)
+    return {
+        "replace": best_of(lambda: [replace_desc(dt) for dt in corpus]),
+        "single_pass": best_of(lambda: [mw_markup.render(dt) for dt in corpus]),
+    }
+
+
+def import_time(module: str, repeat: int = 5):
+    """Wall time of a fresh interpreter importing `module`."""
+    cmd = [sys.executable, "-c", f"import {module}"]
+    return min(timeit.repeat(lambda: subprocess.run(cmd, check=True),
+                             number=1, repeat=repeat))
+
+
+def check_lazy_imports():
+    for module, lazy in LAZY_MODULES.items():
+        code = (f"import sys, {module}; "
+                f"print(*[m for m in {lazy!r} if m in sys.modules])")
+        loaded = subprocess.run([sys.executable, "-c", code], check=True,
+                                capture_output=True, text=True).stdout.split()
+        assert not loaded, f"{module} imports {', '.join(loaded)} at startup"
+
+
+def bench_startup():
+    check_lazy_imports()
+    results = {"interpreter": import_time("sys")}
+    for module in LAZY_MODULES:
+        results[module] = import_time(module)
+    return results
+
+
+BENCHMARKS = {
+    "SingleEntry.get_dict": bench_get_dict,
+    "PonsEntries.process_entries": bench_pons_process_entries,
+    "PonsEntries.get_df": bench_pons_get_df,
+    "LingueeEntries.get_df": bench_linguee_get_df,
+    "senses": bench_senses,
+    "mw_markup.render": bench_mw_markup,
+    "startup": bench_startup,
+}
+
+
+def main():
+    for name, bench in BENCHMARKS.items():
+        results = bench()
+        print(name)
+        for variant, seconds in results.items():
+            print(f"  {variant:<14} {seconds * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Offline benchmark suite timing each stage of a lookup on its own.
+
+Providers and media hosts are answered by a local stub server from the
+recorded payloads in `fixtures/`, caches are disabled and media is written
+to a temporary directory.
+
+    python benchmark_suite.py --save baseline.json
+    python benchmark_suite.py --compare baseline.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import mw_markup
+from benchmark import (TextOnlyEntry, best_of, load_dt_corpus, load_linguee,
+                       load_pons, load_webster)
+from cache import negative_cache, response_cache
+from dict_combine import DictCombine
+from dict_entry import AllEntries, TwoEntries
+from image_fetcher import image_fetcher
+from linguee import LingueeEntries
+from linguee_backend import LINGUEE_URL
+from pons import PonsEntries
+from sessions import session_registry
+from webster import WebsterEntries
+
+import warnings
+warnings.filterwarnings("ignore")
+
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+PONS_FIXTURE = FIXTURES / "pons_spiel.json"
+LINGUEE_FIXTURE = FIXTURES / "linguee_run.json"
+WEBSTER_FIXTURE = FIXTURES / "webster_run.json"
+THESAURUS_FIXTURE = FIXTURES / "thesaurus_run.json"
+DT_FIXTURE = FIXTURES / "webster_dt.json"
+# A stage is a regression when it gets slower than this, relative.
+THRESHOLD = 0.25
+
+# Hosts answered by the stub server, each under its own path prefix.
+STUB_ROUTES = {
+    "api.pons.com": "/pons",
+    "www.dictionaryapi.com": "/webster",
+    "media.merriam-webster.com": "/media",
+    "www.linguee.com": "/media",
+    LINGUEE_URL.split("//")[1]: "/linguee",
+}
+
+
+def stub_responses():
+    json_type = "application/json"
+    return [
+        ("/pons/", json_type, PONS_FIXTURE.read_bytes()),
+        ("/webster/api/v3/references/collegiate/", json_type,
+         WEBSTER_FIXTURE.read_bytes()),
+        ("/webster/api/v3/references/thesaurus/", json_type,
+         THESAURUS_FIXTURE.read_bytes()),
+        ("/linguee/api/v2/translations", json_type,
+         LINGUEE_FIXTURE.read_bytes()),
+        ("/linguee", json_type, b"{}"),
+        ("/media/", "audio/mpeg", b"ID3" + bytes(4 << 10)),
+        ("/images/", "image/jpeg", b"\xff\xd8\xff\xe0" + bytes(24 << 10)),
+    ]
+
+
+class StubServer():
+    """Local HTTP server answering with recorded payloads.
+
+    `responses` are `(path prefix, content type, body)` tuples, the first
+    matching prefix wins. `delay` is added to every response to mimic
+    network latency.
+    """
+
+    def __init__(self, responses: List[Tuple[str, str, bytes]],
+                 delay: float = 0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes, don't let Nagle and
+            # delayed ACKs add 40 ms to every response.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if stub.delay:
+                    time.sleep(stub.delay)
+                for prefix, content_type, body in stub.responses:
+                    if self.path.startswith(prefix):
+                        self.send_response(200)
+                        self.send_header("Content-Type", content_type)
+                        break
+                else:
+                    body = b"Not Found"
+                    self.send_response(404)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.responses = responses
+        self.delay = delay
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@contextmanager
+def offline(delay: float = 0):
+    """Route every provider to a stub server and yield a collection path."""
+    cwd = os.getcwd()
+    caches = response_cache.enabled, negative_cache.enabled
+    url_source = image_fetcher.url_source
+    with StubServer(stub_responses(), delay) as stub, \
+            tempfile.TemporaryDirectory() as tmp:
+        for netloc, prefix in STUB_ROUTES.items():
+            session_registry.route(netloc, f"{stub.url}{prefix}")
+        response_cache.enabled = negative_cache.enabled = False
+        image_fetcher.url_source = \
+            lambda query, limit: [f"{stub.url}/images/{query}.jpg"]
+        os.chdir(tmp)
+        try:
+            yield Path(tmp) / "collection.media"
+        finally:
+            os.chdir(cwd)
+            image_fetcher.url_source = url_source
+            response_cache.enabled, negative_cache.enabled = caches
+            for netloc in STUB_ROUTES:
+                session_registry.route(netloc, None)
+
+
+def stage_pons_fetch(collections_path: Path):
+    return best_of(lambda: PonsEntries("Spiel", "de", "en"),
+                   number=5, repeat=3)
+
+
+def stage_linguee_fetch(collections_path: Path):
+    return best_of(lambda: LingueeEntries("run", "en", "de"),
+                   number=5, repeat=3)
+
+
+def stage_webster_fetch(collections_path: Path):
+    return best_of(lambda: WebsterEntries("run"), number=5, repeat=3)
+
+
+def stage_pons_process_entries(collections_path: Path):
+    return best_of(lambda: load_pons(PONS_FIXTURE))
+
+
+def stage_pons_get_df(collections_path: Path):
+    return best_of(load_pons(PONS_FIXTURE).get_df)
+
+
+def stage_linguee_get_df(collections_path: Path):
+    return best_of(load_linguee(LINGUEE_FIXTURE).get_df)
+
+
+def stage_pons_get_senses(collections_path: Path):
+    return best_of(load_pons(PONS_FIXTURE).get_senses)
+
+
+def stage_linguee_get_senses(collections_path: Path):
+    return best_of(load_linguee(LINGUEE_FIXTURE).get_senses)
+
+
+def stage_webster_process(collections_path: Path):
+    entries = load_webster(WEBSTER_FIXTURE, THESAURUS_FIXTURE)
+    return best_of(lambda: entries.process_webster_entries(
+        thesaurus_entries=entries.thesarus, webster_entries=entries.webster))
+
+
+def stage_mw_markup(collections_path: Path):
+    corpus = load_dt_corpus(DT_FIXTURE)
+    return best_of(lambda: [mw_markup.render(dt) for dt in corpus])
+
+
+def stage_get_dict(collections_path: Path):
+    df, _ = load_linguee(LINGUEE_FIXTURE)()
+    return best_of(lambda: TextOnlyEntry(
+        word="run", entry=df, pos="verb", src_lang="de", dst_lang="en"
+    ).get_dict())
+
+
+def webster_entry(cls, collections_path: Path):
+    df, _ = load_webster(WEBSTER_FIXTURE, THESAURUS_FIXTURE)()
+    return lambda: cls(word="run", entry=df, input_lang="en", src_lang="en",
+                       dst_lang="en", used_dict="webster",
+                       collections_path=collections_path)()
+
+
+def stage_all_entries(collections_path: Path):
+    return best_of(webster_entry(AllEntries, collections_path),
+                   number=3, repeat=3)
+
+
+def stage_two_entries(collections_path: Path):
+    return best_of(webster_entry(TwoEntries, collections_path),
+                   number=3, repeat=3)
+
+
+def stage_anki_row(collections_path: Path):
+    pons, _ = load_pons(PONS_FIXTURE)()
+    linguee, _ = load_linguee(LINGUEE_FIXTURE)()
+    kwargs = dict(word="Spiel", input_lang="de", src_lang="de",
+                  dst_lang="en", collections_path=collections_path,
+                  fetch_media=False)
+    dicts = [TextOnlyEntry(entry=pons, used_dict="pons", **kwargs),
+             TextOnlyEntry(entry=linguee, used_dict="linguee", **kwargs)]
+    return best_of(lambda: DictCombine(dicts=dicts,
+                                       dict_names=["pons", "linguee"]).anki_row)
+
+
+STAGES = {
+    "pons.fetch": stage_pons_fetch,
+    "linguee.fetch": stage_linguee_fetch,
+    "webster.fetch": stage_webster_fetch,
+    "PonsEntries.process_entries": stage_pons_process_entries,
+    "PonsEntries.get_df": stage_pons_get_df,
+    "LingueeEntries.get_df": stage_linguee_get_df,
+    "PonsEntries.get_senses": stage_pons_get_senses,
+    "LingueeEntries.get_senses": stage_linguee_get_senses,
+    "WebsterEntries.process_webster_entries": stage_webster_process,
+    "mw_markup.render": stage_mw_markup,
+    "SingleEntry.get_dict": stage_get_dict,
+    "AllEntries": stage_all_entries,
+    "TwoEntries": stage_two_entries,
+    "DictCombine.anki_row": stage_anki_row,
+}
+
+
+def run(stages: Optional[List[str]] = None, delay: float = 0):
+    timings = {}
+    with offline(delay) as collections_path:
+        for name in stages or STAGES:
+            # Providers print progress, keep the report readable.
+            with redirect_stdout(io.StringIO()):
+                timings[name] = STAGES[name](collections_path)
+            print(f"  {name:<40} {timings[name] * 1000:9.3f} ms")
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "delay": delay,
+        "stages": timings,
+    }
+
+
+def compare(baseline: dict, results: dict, threshold: float = THRESHOLD):
+    """Print both timings per stage, return the stages that regressed."""
+    regressions = {}
+    for name, seconds in results["stages"].items():
+        before = baseline["stages"].get(name)
+        if not before:
+            continue
+        ratio = seconds / before
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions[name] = ratio
+            flag = "REGRESSION"
+        print(f"  {name:<40} {before * 1000:9.3f} -> {seconds * 1000:9.3f} ms"
+              f"  x{ratio:5.2f} {flag}")
+    return regressions
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES))
+    parser.add_argument("--delay", type=float, default=0,
+                        help="seconds of latency added to every stub response")
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(args)
+
+    results = run(args.stages, args.delay)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare}:")
+        if regressions := compare(baseline, results, args.threshold):
+            print(f"{len(regressions)} stage(s) regressed: "
+                  f"{', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional
+
+from metrics import metrics
+
+if TYPE_CHECKING:
+    import requests
+
+
+CACHE_PATH = Path("cache/responses.sqlite")
+NEGATIVE_CACHE_PATH = Path("cache/misses.sqlite")
+DAY = 24 * 60 * 60
+# Errors meaning the provider has no entry for the word. Webster reports
+# none and returns an empty frame.
+MISS_ERRORS = (None, "empty", "not_found")
+
+
+def normalize_word(word: str):
+    word = unicodedata.normalize("NFC", word)
+    return " ".join(word.split()).lower()
+
+
+def is_cacheable(response):
+    """Only successful JSON responses are cached, never errors, throttling
+    or error pages served with a 2xx status."""
+    if not 200 <= response.status_code < 300:
+        return False
+    try:
+        json.loads(response.text)
+    except ValueError:
+        return False
+    return True
+
+
+def connect(path: Path, *schema: str):
+    if str(path) != ":memory:":
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    for statement in schema:
+        conn.execute(statement)
+    return conn
+
+
+class ResponseCache():
+    """SQLite cache of raw provider responses shared by all dictionaries."""
+
+    def __init__(self,
+                 path: Path = CACHE_PATH,
+                 ttl: float = 30 * DAY,
+                 max_entries: int = 20000,
+                 enabled: bool = True,
+                 ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = connect(
+                self.path,
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "provider TEXT, word TEXT, langs TEXT, payload TEXT, "
+                "created_at REAL, accessed_at REAL, "
+                "PRIMARY KEY (provider, word, langs))",
+                "CREATE INDEX IF NOT EXISTS responses_accessed "
+                "ON responses (accessed_at)"
+            )
+        return self._conn
+
+    def get(self, provider: str, word: str, langs: str = "") -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = (provider, normalize_word(word), langs)
+        now = time.time()
+        with self._lock:
+            found = self.conn.execute(
+                "SELECT payload, created_at FROM responses "
+                "WHERE provider = ? AND word = ? AND langs = ?", key
+            ).fetchone()
+            if found is None or now - found[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.conn.execute(
+                "UPDATE responses SET accessed_at = ? "
+                "WHERE provider = ? AND word = ? AND langs = ?", (now, *key)
+            )
+            self.conn.commit()
+            self.hits += 1
+            return found[0]
+
+    def set(self, provider: str, word: str, langs: str, payload: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (provider, normalize_word(word), langs, payload, now, now)
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        self.conn.execute(
+            "DELETE FROM responses WHERE created_at < ?",
+            (time.time() - self.ttl,)
+        )
+        n = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if n > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM responses WHERE rowid IN ("
+                "SELECT rowid FROM responses ORDER BY accessed_at LIMIT ?)",
+                (n - self.max_entries,)
+            )
+
+    def fetch(self, provider: str, word: str, langs: str,
+              request: Callable[[], "requests.Response"],
+              cacheable: Callable[[str], bool] = bool):
+        """Return a cached payload or the body of the response `request`
+        returns, storing it if it `is_cacheable` and `cacheable`."""
+        if (payload := self.get(provider, word, langs)) is not None:
+            metrics.inc("cache_hits_total", provider=provider)
+            return payload
+        metrics.inc("cache_misses_total", provider=provider)
+        with metrics.stage("fetch", word=word, provider=provider):
+            response = request()
+        payload = response.text
+        if is_cacheable(response) and cacheable(payload):
+            self.set(provider, word, langs, payload)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class NegativeCache():
+    """Words a provider is known not to have, remembered for `ttl` seconds.
+
+    Only definite misses are stored (see `MISS_ERRORS`): successful
+    responses without entries, like a PONS 204 or an empty result. Transient
+    errors like "503" are never stored, and HTTP errors are raised by the
+    providers before they get here, so a hit can be answered without any
+    request.
+    """
+
+    def __init__(self,
+                 path: Path = NEGATIVE_CACHE_PATH,
+                 ttl: float = 7 * DAY,
+                 enabled: bool = True,
+                 ):
+        self.path = path
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = connect(
+                self.path,
+                "CREATE TABLE IF NOT EXISTS misses ("
+                "provider TEXT, word TEXT, langs TEXT, error TEXT, "
+                "created_at REAL, PRIMARY KEY (provider, word, langs))"
+            )
+        return self._conn
+
+    @staticmethod
+    def is_miss(error: Optional[str]):
+        return error in MISS_ERRORS
+
+    def get(self, provider: str, word: str, langs: str = ""):
+        """Return `(True, error)` for a known miss, `(False, None)` otherwise."""
+        if not self.enabled:
+            return False, None
+        key = (provider, normalize_word(word), langs)
+        with self._lock:
+            found = self.conn.execute(
+                "SELECT error, created_at FROM misses "
+                "WHERE provider = ? AND word = ? AND langs = ?", key
+            ).fetchone()
+            if found is None or time.time() - found[1] > self.ttl:
+                return False, None
+            self.hits += 1
+        metrics.inc("negative_cache_hits_total", provider=provider)
+        return True, found[0]
+
+    def add(self, provider: str, word: str, langs: str, error: Optional[str]):
+        if not self.enabled or not self.is_miss(error):
+            return
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM misses WHERE created_at < ?",
+                (time.time() - self.ttl,)
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO misses VALUES (?, ?, ?, ?, ?)",
+                (provider, normalize_word(word), langs, error, time.time())
+            )
+            self.conn.commit()
+
+    def discard(self, provider: str, word: str, langs: str = ""):
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM misses WHERE provider = ? AND word = ? AND langs = ?",
+                (provider, normalize_word(word), langs)
+            )
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM misses")
+            self.conn.commit()
+
+    def stats(self):
+        return {"hits": self.hits}
+
+
+response_cache = ResponseCache()
+negative_cache = NegativeCache()
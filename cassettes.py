@@ -0,0 +1,199 @@
+import base64
+import contextlib
+import contextvars
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from cache import negative_cache, normalize_word, response_cache
+from deadline import request_timeout
+
+
+CASSETTES_PATH = Path("cassettes")
+OFF, RECORD, REPLAY = "off", "record", "replay"
+# Query parameters holding API keys, never written to a cassette.
+SECRET_PARAMS = {"key"}
+# Cassette of requests made outside of any word, e.g. readiness probes.
+SHARED = "_shared"
+
+_word = contextvars.ContextVar("cassette_word", default=None)
+# Set while a request is being recorded, so that a send wrapped again by
+# another cassette hook goes straight to the network.
+_recording = contextvars.ContextVar("cassette_recording", default=False)
+
+
+class CassetteMiss(requests.ConnectionError):
+    pass
+
+
+def request_key(url: str):
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k not in SECRET_PARAMS]
+    return f"GET {urlunsplit(parts._replace(query=urlencode(query)))}"
+
+
+def cassette_name(word: str):
+    word = normalize_word(word)
+    slug = re.sub(r"[^\w]+", "_", word)[:60].strip("_")
+    return f"{slug}-{hashlib.sha1(word.encode()).hexdigest()[:8]}.json.gz"
+
+
+def encode_body(content: bytes, content_type: str):
+    if content_type.startswith(("text/", "application/json")):
+        try:
+            return {"text": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            pass
+    return {"base64": base64.b64encode(content).decode("ascii")}
+
+
+def decode_body(body: dict):
+    if "text" in body:
+        return body["text"].encode("utf-8")
+    return base64.b64decode(body["base64"])
+
+
+class Cassettes():
+    """Record provider and media HTTP traffic per word, or replay it.
+
+    In record mode every response is stored in a gzipped JSON cassette
+    named after the word being looked up (see `word`). In replay mode the
+    same requests are answered from the cassettes without any network,
+    optionally delayed by `latency` seconds plus `latency_scale` times the
+    recorded response time.
+    """
+
+    def __init__(self, mode: str = OFF, path: Path = CASSETTES_PATH,
+                 latency: float = 0, latency_scale: float = 0):
+        self.configure(mode, path, latency, latency_scale)
+
+    def configure(self, mode: str = OFF, path: Path = CASSETTES_PATH,
+                  latency: float = 0, latency_scale: float = 0):
+        if mode not in (OFF, RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.mode = mode
+        self.path = Path(path)
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.loaded = {}
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.mode != OFF
+
+    @contextlib.contextmanager
+    def word(self, word: str):
+        """Store the requests made inside the block in `word`'s cassette."""
+        token = _word.set(word)
+        try:
+            yield
+        finally:
+            _word.reset(token)
+
+    def _cassette(self, name: str):
+        if name not in self.loaded:
+            file = self.path / name
+            if file.exists():
+                with gzip.open(file, "rt", encoding="utf-8") as f:
+                    self.loaded[name] = json.load(f)
+            else:
+                self.loaded[name] = {}
+        return self.loaded[name]
+
+    def _save(self, name: str):
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / f"{name}.part"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(self.loaded[name], f, ensure_ascii=False,
+                      separators=(",", ":"))
+        tmp.replace(self.path / name)
+
+    def get(self, url: str, timeout: float,
+            send: Callable[..., requests.Response], **kwargs):
+        """Answer a GET through `send` (record) or from a cassette (replay).
+
+        Nested calls, from a `send` that is itself wrapped, are passed
+        through, so every request is recorded once.
+        """
+        if _recording.get():
+            return send(url, timeout, **kwargs)
+        name = cassette_name(_word.get() or SHARED)
+        key = request_key(url)
+        if self.mode == REPLAY:
+            with self._lock:
+                recorded = self._cassette(name).get(key)
+            if recorded is None:
+                raise CassetteMiss(f"No recorded response for {key} in {name}")
+            return self._replay(url, timeout, recorded)
+        token = _recording.set(True)
+        try:
+            response = send(url, timeout, **kwargs)
+        finally:
+            _recording.reset(token)
+        content_type = response.headers.get("Content-Type", "")
+        recorded = {
+            "status": response.status_code,
+            "content_type": content_type,
+            "elapsed": round(response.elapsed.total_seconds(), 4),
+            **encode_body(response.content, content_type),
+        }
+        with self._lock:
+            self._cassette(name)[key] = recorded
+            self._save(name)
+        return response
+
+    def value(self, key: str, compute: Callable[[], object]):
+        """Record or replay a JSON value, for lookups made outside requests
+        like image search."""
+        name = cassette_name(_word.get() or SHARED)
+        with self._lock:
+            cassette = self._cassette(name)
+            if self.mode == REPLAY:
+                if key not in cassette:
+                    raise CassetteMiss(f"No recorded value for {key} in {name}")
+                return cassette[key]["value"]
+        value = compute()
+        with self._lock:
+            self._cassette(name)[key] = {"value": value}
+            self._save(name)
+        return value
+
+    def _replay(self, url: str, timeout: float, recorded: dict):
+        delay = self.latency + self.latency_scale * recorded["elapsed"]
+        if delay:
+            timeout = request_timeout(timeout)
+            time.sleep(min(delay, timeout))
+            if delay > timeout:
+                raise requests.Timeout(f"Replayed latency {delay:.2f}s exceeds {timeout:.2f}s")
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.headers = CaseInsensitiveDict(
+            {"Content-Type": recorded["content_type"]})
+        response._content = decode_body(recorded)
+        response._content_consumed = True
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers) or "utf-8"
+        response.url = url
+        return response
+
+
+cassettes = Cassettes()
+
+
+def use_cassettes(mode: str, path: Path = CASSETTES_PATH,
+                  latency: float = 0, latency_scale: float = 0):
+    """Switch cassette mode; caches are bypassed while recording or replaying
+    so that every request goes through the cassettes."""
+    cassettes.configure(mode, path, latency, latency_scale)
+    response_cache.enabled = negative_cache.enabled = not cassettes.active
@@ -0,0 +1,104 @@
+import contextvars
+import errno
+import functools
+import os
+import threading
+import time
+from typing import Optional
+
+
+# Socket timeout of a single dictionary API request.
+DICT_TIMEOUT = 20
+# Whole lookup of a word in one dictionary, retries included. Leaves room
+# for starting linguee-api on the first lookup.
+LOOKUP_TIMEOUT = 45
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class Deadline():
+    """Point in time after which a fetch should give up.
+
+    Works in any thread, asyncio task or subprocess: code under a deadline
+    checks it between steps and caps its socket timeouts with `remaining`.
+    """
+
+    def __init__(self, seconds: float, error_message: str = os.strerror(errno.ETIME)):
+        self.expires = time.monotonic() + seconds
+        self.error_message = error_message
+        self.cancelled = False
+
+    def remaining(self):
+        return max(self.expires - time.monotonic(), 0)
+
+    @property
+    def expired(self):
+        return self.cancelled or self.remaining() == 0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.expired:
+            raise TimeoutError(self.error_message)
+
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+def check_deadline():
+    if deadline := current_deadline():
+        deadline.check()
+
+
+def request_timeout(seconds: float):
+    """Socket timeout for a request, capped by the current deadline."""
+    if deadline := current_deadline():
+        deadline.check()
+        return min(seconds, deadline.remaining())
+    return seconds
+
+
+def timeout(seconds=10, error_message=os.strerror(errno.ETIME)):
+    """Raise TimeoutError if the call takes longer than `seconds`.
+
+    The call runs in a helper thread under a Deadline, so this works outside
+    the main thread too. When the caller gives up the deadline is cancelled
+    and the call stops at its next check.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            deadline = Deadline(seconds, error_message)
+            if parent := current_deadline():
+                deadline.expires = min(deadline.expires, parent.expires)
+            context = contextvars.copy_context()
+            outcome = {}
+
+            def target():
+                _deadline.set(deadline)
+                try:
+                    outcome["result"] = func(*args, **kwargs)
+                except BaseException as e:
+                    outcome["error"] = e
+
+            thread = threading.Thread(target=context.run, args=(target,),
+                                      daemon=True)
+            thread.start()
+            thread.join(deadline.remaining())
+            if thread.is_alive():
+                deadline.cancel()
+                raise TimeoutError(error_message)
+            if "error" in outcome:
+                raise outcome["error"]
+            return outcome["result"]
+
+        return wrapper
+
+    return decorator
@@ -1,8 +1,8 @@
-import shutil
 from typing import Optional
 from pathlib import Path
 from abc import ABC, abstractmethod
 from utils import downloadimages
+from media_store import media_store
 
 class DictBase(ABC):
     def __init__(self, original_word: str,
@@ -28,8 +28,7 @@ class DictBase(ABC):
             img_word = self.word
         image_path = downloadimages(img_word)
         img_name = image_path.parent.stem + image_path.suffix
-        img_dst = self.collections_path / img_name
-        shutil.copy(image_path, img_dst)
+        media_store.place_file(image_path, self.collections_path / img_name)
         return f"<img src='{img_name}'>"
 
     @property
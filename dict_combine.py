@@ -1,26 +1,56 @@
+import asyncio
 import pandas as pd
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, Optional, List, Union
 from pydantic import BaseModel
-from dict_entry import DictEntry
+from dict_entry import SingleEntry
+from batch import ProviderLimit, get_limiters, run_coroutine
+from media import MEDIA_WORKERS, MediaStage
 
 
 class TooManyRequestsError(Exception):
     pass
 
 
+def is_empty(value):
+    if isinstance(value, str):
+        return value == ""
+    return pd.api.types.is_scalar(value) and pd.isnull(value)
+
+
+def lookup_error(error: Exception):
+    """Error of a lookup that raised `error`: the HTTP status if it has one,
+    like the "503" providers return, otherwise the exception name."""
+    if (response := getattr(error, "response", None)) is not None:
+        return str(response.status_code)
+    return type(error).__name__
+
+
+SINGLE_VALUE_FIELDS = ("picture", "processed_word", "definition", "audio",
+                       "gender_src", "gender_dst", "tenses_plural", "pos",
+                       "pos_dst", "original_word", "source", "image_request",
+                       "audio_request")
+MULTIPLE_VALUE_FIELDS = ("example_src", "example_dst")
+EXAMPLES_PRIORITY = ["linguee", "pons"]
+
+
 class DictCombine(BaseModel):
-    dicts: List[DictEntry]
+    dicts: List[SingleEntry]
     dict_names: List[str]
     entries: dict = {}
     errors: List[str] = []  # TODO: Should be an Enum
     external_example_dst: str = ""
     external_example_src: str = ""
+    resolved: dict = {}
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # `errors` passed in are of lookups that failed outright.
+        lookup_errors = self.errors
         self.entries, self.errors = self.get_entries()
+        self.errors += lookup_errors
         self.validate_external_examples()
+        self.resolved = self.resolve()
 
     def validate_external_examples(self):
         if self.external_example_dst and not self.external_example_src:
@@ -41,25 +71,100 @@ class DictCombine(BaseModel):
         dst_lang: str = "de",
         external_example_src: str = "",
         external_example_dst: str = "",
-        collections_path: Path = Path("~/.local/share/Anki2/User 1/collection.media")
+        collections_path: Path = Path("~/.local/share/Anki2/User 1/collection.media"),
+        media_workers: int = MEDIA_WORKERS
     ):
         dicts = []
         for dtu in dicts_to_use:
-            d = DictEntry(word=word,
-                          pos=pos,
-                          input_lang=input_lang,
-                          manual_selection=manual_selection,
-                          src_lang=src_lang,
-                          dst_lang=dst_lang,
-                          used_dict=dtu,
-                          source=source,
-                          collections_path=collections_path)
-            if d():
+            if d := cls._lookup(word=word,
+                                pos=pos,
+                                input_lang=input_lang,
+                                manual_selection=manual_selection,
+                                src_lang=src_lang,
+                                dst_lang=dst_lang,
+                                used_dict=dtu,
+                                source=source,
+                                collections_path=collections_path):
                 dicts.append(d)
-        return cls(dicts=dicts,
-                   dict_names=dicts_to_use,
-                   external_example_src=external_example_src,
-                   external_example_dst=external_example_dst)
+        combine = cls(dicts=dicts,
+                      dict_names=dicts_to_use,
+                      external_example_src=external_example_src,
+                      external_example_dst=external_example_dst)
+        cls.fetch_media([combine], media_workers)
+        return combine
+
+    @staticmethod
+    def _lookup(**kwargs):
+        d = SingleEntry(fetch_media=False, **kwargs)
+        if d():
+            return d
+        return None
+
+    @staticmethod
+    def fetch_media(combines: list, workers: int = MEDIA_WORKERS):
+        """Fetch only the picture and audio each card ended up using."""
+        MediaStage(workers).apply([c.resolved for c in combines])
+
+    @classmethod
+    def init_many(
+        cls,
+        words: List[Union[str, dict]],
+        dicts_to_use: List[str],
+        limits: Optional[Dict[str, ProviderLimit]] = None,
+        media_workers: int = MEDIA_WORKERS,
+        **kwargs
+    ):
+        """Look up many words concurrently.
+
+        `words` holds either plain words or dicts with per-word `init`
+        arguments (`word`, `pos`, `external_example_src`, ...). `kwargs` are
+        shared by all words. Results keep the order of `words`. A lookup
+        that raises only adds its error to the word's `errors`. Media is
+        fetched afterwards for the whole batch.
+        """
+        combines = run_coroutine(cls.ainit_many(words, dicts_to_use, limits,
+                                                **kwargs))
+        cls.fetch_media(combines, media_workers)
+        return combines
+
+    @classmethod
+    async def ainit_many(
+        cls,
+        words: List[Union[str, dict]],
+        dicts_to_use: List[str],
+        limits: Optional[Dict[str, ProviderLimit]] = None,
+        **kwargs
+    ):
+        limiters = get_limiters(dicts_to_use, limits)
+
+        async def init_word(word):
+            word_kwargs = {**kwargs, **word} if isinstance(word, dict) else \
+                {**kwargs, "word": word}
+            external_example_src = word_kwargs.pop("external_example_src", "")
+            external_example_dst = word_kwargs.pop("external_example_dst", "")
+            lookups = [limiters[dtu].run(cls._lookup, used_dict=dtu,
+                                         **word_kwargs)
+                       for dtu in dicts_to_use]
+            dicts, names, errors = [], [], []
+            for dtu, d in zip(dicts_to_use,
+                              await asyncio.gather(*lookups,
+                                                   return_exceptions=True)):
+                if isinstance(d, Exception):
+                    print(f"{dtu} lookup of {word_kwargs['word']} failed: {d!r}")
+                    errors.append(lookup_error(d))
+                elif d:
+                    dicts.append(d)
+                    names.append(dtu)
+            return await asyncio.to_thread(
+                cls,
+                dicts=dicts,
+                dict_names=names,
+                errors=errors,
+                external_example_src=external_example_src,
+                external_example_dst=external_example_dst
+            )
+
+        return await asyncio.gather(*[init_word(w) for w in words])
 
     class Config:
         arbitrary_types_allowed = True
@@ -72,93 +177,95 @@ class DictCombine(BaseModel):
             errors.append(error)
         return entries, errors
 
-    def __prepare_df(self, key: str, sort: list = []):
-        df = pd.DataFrame()
-        kk = [k for k in self.entries.keys()]
-        vv = [v.get(key) for v in self.entries.values()]
-        df["dictionary"] = kk
-        df["value"] = vv
+    def __sorted_values(self, key: str, sort: list = []):
+        values = [(k, v.get(key)) for k, v in self.entries.items()]
         if sort:
             custom_sort = {x: i for i, x in enumerate(sort)}
-            df = df.sort_values(by=["dictionary"], key=lambda x: x.map(custom_sort))
-        non_empty_df = df.loc[(~pd.isnull(df.value)) & (df.value != "")]
-        if not non_empty_df.empty:
-            return non_empty_df
-        return df
-
-    def __return_single_value(self, key: str, sort: list = [],
-                              examples: list = []):
-        df = self.__prepare_df(key, sort)
-        return df.iloc[0].value
-
-    def __return_multiple_value(self, key: str, sort: list = [],
-                                examples: list = []):
-        df = self.__prepare_df(key, sort)
-        df = df.loc[(~pd.isnull(df.value)) & (df.value != "")]
-        if df.empty:
+            values.sort(key=lambda kv: custom_sort.get(kv[0], len(sort)))
+        return [v for _, v in values]
+
+    @staticmethod
+    def __non_empty(values: list):
+        return [v for v in values if not is_empty(v)]
+
+    def __resolve_single_value(self, key: str, sort: list = []):
+        values = self.__sorted_values(key, sort)
+        if non_empty := self.__non_empty(values):
+            return non_empty[0]
+        return values[0]
+
+    def __resolve_multiple_value(self, key: str, sort: list = []):
+        values = self.__non_empty(self.__sorted_values(key, sort))
+        if not values:
             return ""
-        examples = "<br>".join(df.value.to_list()).split("<br>")
+        examples = "<br>".join(values).split("<br>")
         if len(examples) >= 2:
             return f"1. {examples[0]}<br> 2. {examples[1]}"
         return examples[0]
 
+    def resolve(self):
+        """Pick every card field once, in provider priority order."""
+        if not self.entries:
+            return {}
+        resolved = {key: self.__resolve_single_value(key)
+                    for key in SINGLE_VALUE_FIELDS}
+        for key in MULTIPLE_VALUE_FIELDS:
+            resolved[key] = self.__resolve_multiple_value(
+                key, sort=EXAMPLES_PRIORITY
+            )
+        return resolved
+
     @property
     def picture(self):
-        return self.__return_single_value("picture")
+        return self.resolved.get("picture")
 
     @property
     def processed_word(self):
-        return self.__return_single_value("processed_word")
+        return self.resolved.get("processed_word")
 
     @property
     def definition(self):
-        return self.__return_single_value("definition")
+        return self.resolved.get("definition")
 
     @property
     def audio(self):
-        return self.__return_single_value("audio")
+        return self.resolved.get("audio")
 
     @property
     def example_src(self):
-        return self.__return_multiple_value(
-            "example_src", sort=["linguee", "pons"],
-            examples=[self.external_example_src]
-        )
+        return self.resolved.get("example_src")
 
     @property
     def example_dst(self):
-        return self.__return_multiple_value(
-            "example_dst", sort=["linguee", "pons"],
-            examples=[self.external_example_dst]
-        )
+        return self.resolved.get("example_dst")
 
     @property
     def gender_src(self):
-        return self.__return_single_value("gender_src")
+        return self.resolved.get("gender_src")
 
     @property
     def gender_dst(self):
-        return self.__return_single_value("gender_dst")
+        return self.resolved.get("gender_dst")
 
     @property
     def tenses_plural(self):
-        return self.__return_single_value("tenses_plural")
+        return self.resolved.get("tenses_plural")
 
     @property
     def pos(self):
-        return self.__return_single_value("pos")
+        return self.resolved.get("pos")
 
     @property
     def pos_dst(self):
-        return self.__return_single_value("pos_dst")
+        return self.resolved.get("pos_dst")
 
     @property
     def original_word(self):
-        return self.__return_single_value("original_word")
+        return self.resolved.get("original_word")
 
     @property
     def source(self):
-        return self.__return_single_value("source")
+        return self.resolved.get("source")
 
     @property
     def anki_row(self):
@@ -1,27 +1,94 @@
-from typing import Optional
+import functools
+import heapq
+import importlib
+from typing import Dict, Optional, Union
 import pandas as pd
-import shutil
 
 from pathlib import Path
-from utils import (get_audio, pos_processing, word_processing, noun_processing, 
-                   verb_processing, downloadimages)
-from dict_base import DictBase
-from linguee import LingueeEntries
-from pons import PonsEntries
-from webster import WebsterEntries
-
-
-entries_factory = {
-    "pons": PonsEntries,
-    "linguee": LingueeEntries,
-    "webster": WebsterEntries,
-}
+from utils import (pos_processing, word_processing, noun_processing,
+                   verb_processing)
+from media import (MEDIA_WORKERS, AudioRequest, ImageRequest, MediaStage,
+                   fetch_audio, fetch_image)
+from cache import negative_cache
+from cassettes import cassettes
+from deadline import LOOKUP_TIMEOUT, timeout
+from metrics import metrics
+from senses import Sense, Senses, as_senses
+
+
+class ProviderRegistry(dict):
+    """Entries classes by dictionary name, imported when first used."""
+
+    def __init__(self, providers: Dict[str, str]):
+        super().__init__()
+        self.providers = dict(providers)
+
+    def __missing__(self, name: str):
+        module, cls = self.providers[name].split(":")
+        provider = getattr(importlib.import_module(module), cls)
+        self[name] = provider
+        return provider
+
+    def __contains__(self, name):
+        return super().__contains__(name) or name in self.providers
+
+
+entries_factory = ProviderRegistry({
+    "pons": "pons:PonsEntries",
+    "linguee": "linguee:LingueeEntries",
+    "webster": "webster:WebsterEntries",
+})
+
+
+@timeout(LOOKUP_TIMEOUT, "Dictionary lookup timed out")
+def fetch_senses(used_dict: str, word: str, src_lang: str, dst_lang: str):
+    provider = entries_factory[used_dict](word, src_lang, dst_lang)
+    return provider.get_senses()
+
+
+def lookup_entries(used_dict: str, word: str, src_lang: str, dst_lang: str):
+    """Look `word` up in `used_dict` unless it is a known miss."""
+    langs = f"{src_lang}-{dst_lang}"
+    metrics.inc("lookups_total", provider=used_dict)
+    known, error = negative_cache.get(used_dict, word, langs)
+    if known:
+        entries = Senses()
+    else:
+        with cassettes.word(word):
+            entries, error = fetch_senses(used_dict, word, src_lang, dst_lang)
+        if entries.empty:
+            negative_cache.add(used_dict, word, langs, error)
+    if error is not None or entries.empty:
+        metrics.error(used_dict, error or "empty")
+    return entries, error
+
+
+def memoized_property(func):
+    """Property computed once per instance, see SingleEntry.__setattr__."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self):
+        if not self.memoize:
+            return func(self)
+        memo = self.__dict__.setdefault("_memo", {})
+        if name not in memo:
+            memo[name] = func(self)
+        return memo[name]
+
+    return property(wrapper)
 
 
 class SingleEntry():
+    # Changing any of these invalidates memoized fields.
+    memo_dependencies = ("entries", "original_pos", "original_word",
+                         "input_lang", "src_lang", "dst_lang",
+                         "collections_path")
+    memoize = True
+
     def __init__(self,
                  word: str,
-                 entry: Optional[pd.DataFrame] = None,
+                 entry: Optional[Union[pd.DataFrame, Senses]] = None,
                  pos: Optional[str] = None,
                  input_lang: Optional[str] = None,
                  manual_selection: bool = False,
@@ -29,7 +96,8 @@ class SingleEntry():
                  dst_lang: str = "de",
                  source: str = "manual",
                  used_dict: str = "pons",
-                 collections_path: Path = Path("~/.local/share/Anki2/User 1/collection.media")):
+                 collections_path: Path = Path("~/.local/share/Anki2/User 1/collection.media"),
+                 fetch_media: bool = True):
         self.original_word = word
         self.original_pos = pos
         self.input_lang = input_lang
@@ -38,111 +106,132 @@ class SingleEntry():
         self.source = source
         self.collections_path = collections_path.expanduser()
         self.manual_selection = manual_selection
+        self.used_dict = used_dict
+        self.fetch_media = fetch_media
         if entry is not None:
-            self.entries, self.error = entry, None 
+            self.entries, self.error = as_senses(entry), None
         else:
-            self.entries, self.error = entries_factory[used_dict](word, src_lang, dst_lang)()
+            self.entries, self.error = lookup_entries(used_dict, word, src_lang, dst_lang)
         self.input_lang = self.get_input_lang(self.input_lang)
 
-    @property
-    def image(self):
+    @memoized_property
+    def image_request(self):
+        return self._image_request(self.word, self.definition)
+
+    def _image_request(self, word: str, definition: str):
         if self.input_lang == self.dst_lang == self.src_lang:
-            img_word = self.word
+            img_word = word
         elif self.input_lang == self.dst_lang:
-            img_word = self.definition
+            img_word = definition
         else:
-            img_word = self.word
+            img_word = word
         img_word = img_word.split("(")[0].strip()
-        image_path = downloadimages(img_word)
-        img_name = image_path.parent.stem + image_path.suffix
-        img_dst = self.collections_path / img_name
-        shutil.copy(image_path, img_dst)
-        return f"<img src='{img_name}'>"
+        return ImageRequest(query=img_word,
+                            collections_path=self.collections_path)
 
-    @property
-    def row(self) -> pd.Series:
-        df = self.entries
-        df = df.loc[df.lang == self.dst_lang]
-        if df.empty:
-            return pd.Series()
+    @memoized_property
+    def image(self):
+        return fetch_image(self.image_request)
+
+    @memoized_property
+    def row(self) -> Optional[Sense]:
+        with metrics.stage("select", word=self.original_word,
+                           provider=self.used_dict):
+            return self.select_row()
+
+    def select_row(self) -> Optional[Sense]:
+        senses = [sense for sense in self.entries
+                  if sense.lang == self.dst_lang]
+        if not senses:
+            return None
         if self.original_pos is not None:
             pos = pos_processing(pos=self.original_pos, lang=self.dst_lang,
                                  word=self.original_word)
-            mask = [x in pos or pos in x for x in df.pos]
-            if any(mask):
-                df = df.loc[mask]
-        df["target_len"] = [len(x.split(" ")) for x in df.target]
+            matching = [sense for sense in senses
+                        if sense.pos in pos or pos in sense.pos]
+            if matching:
+                senses = matching
         # Sometimes first entry for Pons is the whole sentence as a translation
         # instead of simple definition, that's why I'm picking definitions
         # shorter than 4 word.
         # Example: https://de.pons.com/%C3%BCbersetzung/deutsch-englisch/Spiel
-        if not df.iloc[:3].loc[df.iloc[:3].target_len <= 3].empty:
-            df = df.loc[df.target_len <= 3]
-        df.drop(columns=["target_len"], inplace=True)
-        # try:
-        #     df.iloc[0]
-        # except:
-        return df.iloc[0]
+        short = [len(sense.target.split(" ")) <= 3 for sense in senses]
+        if any(short[:3]):
+            return senses[short.index(True)]
+        return senses[0]
 
-    @property
-    def audio(self):
+    @memoized_property
+    def audio_request(self):
+        return self._audio_request(self.row, self.word, self.definition)
+
+    def _audio_request(self, row, word: str, definition: str):
         if self.input_lang == self.dst_lang == self.src_lang:
-            audio = self.row.get("audio_src")
-            word = self.word
+            audio = row.get("audio_src")
         elif self.input_lang == self.src_lang:
-            audio = self.row.get("audio_dst")
-            word = self.definition
+            audio = row.get("audio_dst")
+            word = definition
         else:
-            audio = self.row.get("audio_src")
-            word = self.word
+            audio = row.get("audio_src")
         if audio:
-            return get_audio(audio_url=audio,
-                             word=word,
-                             collections_path=self.collections_path)
+            return AudioRequest(url=audio, word=word,
+                                collections_path=self.collections_path)
+        return None
+
+    @memoized_property
+    def audio(self):
+        if self.audio_request is not None:
+            return fetch_audio(self.audio_request)
         return ""
 
-    @property
+    @memoized_property
     def definition(self):
-        definition = word_processing(self.row.target, "")
+        return self._definition(self.row, self.pos)
+
+    def _definition(self, row, pos: str):
+        definition = word_processing(row["target"], "")
         lang = self.src_lang if self.src_lang != self.input_lang else \
             self.dst_lang
-        if "verb" in self.pos:
+        if "verb" in pos:
             definition = verb_processing(verb=definition,
                                          lang=lang,
-                                         pos=self.pos,
+                                         pos=pos,
                                          )
-        if self.pos == "noun":
+        if pos == "noun":
             definition = noun_processing(noun=definition,
                                          lang=lang,
-                                         gender=self.row.get("gender_src"),
+                                         gender=row.get("gender_src"),
                                          )
         return definition
 
-    @property
+    @memoized_property
     def example_src(self):
         return self.row.get("examples_src")
 
-    @property
+    @memoized_property
     def example_dst(self):
         return self.row.get("examples_dst")
 
-    @property
+    @memoized_property
     def gender_src(self):
         return self.row.get("gender_src")
 
-    @property
+    @memoized_property
     def gender_dst(self):
         return self.row.get("gender_dst")
 
-    @property
+    @memoized_property
     def pos_dst(self):
         return self.row.get("pos_dst", "")
 
-    @property
+    @memoized_property
     def tenses_plural(self):
-        if forms := self.row.get("forms"):
+        return self._tenses_plural(self.row)
+
+    @staticmethod
+    def _tenses_plural(row):
+        if forms := row.get("forms"):
             return forms
-        if flexion := self.row.get("flexion"):
+        if flexion := row.get("flexion"):
             return flexion
         return ""
 
@@ -167,67 +256,99 @@ class SingleEntry():
 #     else:
 #         return self.pons_plural
 
-    @property
+    @memoized_property
     def pos(self):
-        if self.original_pos is None:
-            return self.row.pos
+        return self._pos(self.row, self.original_pos)
+
+    @staticmethod
+    def _pos(row, original_pos: Optional[str]):
+        if original_pos is None:
+            return row["pos"]
         # If orginal_pos is wrong we want to take pos from row
-        if self.original_pos not in self.row.pos:
-            return self.row.pos
-        return self.original_pos
+        if original_pos not in row["pos"]:
+            return row["pos"]
+        return original_pos
+
+    def __setattr__(self, name, value):
+        if name in self.memo_dependencies:
+            self.__dict__.pop("_memo", None)
+        super().__setattr__(name, value)
 
     def get_input_lang(self, input_lang):
         if input_lang is None:
             if self.entries.empty:
                 return ""
-            return self.row.get("lang")
+            return self.row.lang if self.row is not None else None
         return input_lang
 
-    @property
+    @memoized_property
     def word(self):
-        if processed_word := self.row.get("processed_word"):
+        return self._word(self.row, self.pos, self.original_word)
+
+    def _word(self, row, pos: str, original_word: str):
+        if processed_word := row.get("processed_word"):
             return processed_word
-        word = word_processing(self.original_word, sense=self.row.get("sense", ""))
-        if "verb" in self.pos:
+        word = word_processing(original_word, sense=row.get("sense", ""))
+        if "verb" in pos:
             word = verb_processing(verb=word,
                                    lang=self.input_lang,
-                                   pos=self.pos,
+                                   pos=pos,
                                    )
-        if self.pos == "noun":
+        if pos == "noun":
             word = noun_processing(noun=word,
                                    lang=self.input_lang,
-                                   gender=self.row.get("gender_src"),
+                                   gender=row.get("gender_src"),
                                    )
         return word
 
-    def get_dict(self):
+    def get_dict(self, fetch_media: Optional[bool] = None):
+        """Card fields of the entry.
+
+        Without `fetch_media` picture and audio are left empty and only their
+        requests are returned, for a MediaStage to fetch later.
+        """
+        if fetch_media is None:
+            fetch_media = self.fetch_media
         if self.error is not None:
             return {}, self.error
-        if self.entries.empty or self.row.empty:
+        if self.entries.empty or self.row is None:
             return {}
+        row_dict = self.render(self.row, self.original_word, self.original_pos)
+        if fetch_media:
+            row_dict["picture"] = self.image
+            row_dict["audio"] = self.audio
+        return row_dict, None
+
+    def render(self, row, original_word: str, original_pos: Optional[str]):
+        """Card fields of one sense `row`, with picture and audio left to a
+        MediaStage."""
+        pos = self._pos(row, original_pos)
+        word = self._word(row, pos, original_word)
+        definition = self._definition(row, pos)
         if self.input_lang == self.dst_lang == self.src_lang:
-            processed_word = self.word
+            processed_word = word
         elif self.input_lang == self.src_lang:
-            processed_word = self.definition
+            processed_word = definition
         else:
-            processed_word = self.word
+            processed_word = word
 
-        row_dict = {
+        return {
             "processed_word": processed_word,
-            "picture": self.image,
-            "definition": self.definition,
-            "audio": self.audio,
-            "example_src": self.example_src,
-            "gender_src": self.gender_src,
-            "gender_dst": self.gender_dst,
-            "tenses_plural": self.tenses_plural,
-            "example_dst": self.example_dst,
-            "pos": self.pos,
-            "pos_dst": self.pos_dst,
-            "original_word": self.original_word,
-            "source": self.source
+            "picture": "",
+            "definition": definition,
+            "audio": "",
+            "example_src": row.get("examples_src"),
+            "gender_src": row.get("gender_src"),
+            "gender_dst": row.get("gender_dst"),
+            "tenses_plural": self._tenses_plural(row),
+            "example_dst": row.get("examples_dst"),
+            "pos": pos,
+            "pos_dst": row.get("pos_dst", ""),
+            "original_word": original_word,
+            "source": self.source,
+            "image_request": self._image_request(word, definition),
+            "audio_request": self._audio_request(row, word, definition),
         }
-        return row_dict, None
 
     def __call__(self):
         return self.get_dict()
@@ -253,31 +374,23 @@ class SingleEntry():
 
 
 class AllEntries(SingleEntry):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.used_dict = kwargs.get("used_dict")
+    media_workers = MEDIA_WORKERS
 
     def __call__(self):
         if self.entries.empty:
             return []
-        entries = self.entries.loc[self.entries.n <= 3]
+        # Entry-level context is resolved once; every sense is rendered
+        # against it and identical media requests are fetched once.
+        word, pos = self.word, self.pos
+        senses = [sense for sense in self.entries
+                  if sense.n <= 3 and sense.lang == self.dst_lang]
         results = []
-        for ix, entry in entries.iterrows():
-            single_entry = SingleEntry(
-                word=self.word, 
-                entry=pd.DataFrame([entry]), 
-                pos=self.pos, 
-                input_lang=self.input_lang,
-                manual_selection=self.manual_selection,
-                src_lang=self.src_lang,
-                dst_lang=self.dst_lang,
-                source=self.source,
-                used_dict=self.used_dict)
-            result, _ = single_entry()
-            if entry["n"] > 1:
-                result["processed_word"] = f"{result['processed_word']} {entry['n']}"
+        for sense in senses:
+            result = self.render(sense, original_word=word, original_pos=pos)
+            if sense.n > 1:
+                result["processed_word"] = f"{result['processed_word']} {sense.n}"
             results.append(result)
-
+        MediaStage(self.media_workers).apply(results)
         return results
 
         
@@ -301,28 +414,57 @@ class AllEntries(SingleEntry):
          )
 
 class TwoEntries(SingleEntry):
+    media_workers = MEDIA_WORKERS
+    # Number of parts of speech rendered when no pos is given.
+    max_pos = 2
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.pos_set = self.original_pos is not None
 
     @property
     def all_pos(self):
-        all_pos = self.entries.pos.drop_duplicates()
+        all_pos = list(dict.fromkeys(sense.pos for sense in self.entries))
         if all_pos[0] == "phrase":
-            all_pos = all_pos[[0]]
+            all_pos = all_pos[:1]
         return all_pos
     
+    @memoized_property
+    def pos_index(self) -> Dict[str, list]:
+        """Senses in `dst_lang` grouped by pos, as `(position, target length,
+        sense)` tuples in entry order."""
+        index = {}
+        senses = [sense for sense in self.entries
+                  if sense.lang == self.dst_lang]
+        for position, sense in enumerate(senses):
+            index.setdefault(sense.pos, []).append(
+                (position, len(sense.target.split(" ")), sense))
+        return index
+
+    def select_sense(self, pos: str) -> Sense:
+        """The sense `select_row` would pick for `pos`, looked up in the
+        matching pos groups instead of the whole frame."""
+        pos = pos_processing(pos=pos, lang=self.dst_lang,
+                             word=self.original_word)
+        groups = [group for key, group in self.pos_index.items()
+                  if key in pos or pos in key]
+        senses = list(heapq.merge(*(groups or self.pos_index.values()),
+                                  key=lambda sense: sense[0]))
+        # Prefer short definitions, see select_row.
+        if any(length <= 3 for _, length, _ in senses[:3]):
+            return next(sense for _, length, sense in senses if length <= 3)
+        return senses[0][2]
+
     def get_dicts(self):
         if self.entries.empty:
             return [{}]
-        dicts = []
         if self.pos_set:
-            return [self.get_dict()[0]]
-        for pos in self.all_pos[:2]:
-            self.original_pos = pos
+            dicts = [self.get_dict(fetch_media=False)[0]]
+        else:
             # Assuming we don't accept errors from Webster
-            result, _ = self.get_dict()
-            dicts.append(result)
+            dicts = [self.render(self.select_sense(pos), self.original_word, pos)
+                     for pos in self.all_pos[:self.max_pos]]
+        MediaStage(self.media_workers).apply(dicts)
         return dicts
 
     def __call__(self):
@@ -0,0 +1,125 @@
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import requests
+
+from cassettes import cassettes
+from deadline import check_deadline
+from sessions import session_registry
+
+
+IMAGES_PATH = Path("simple_images")
+MIN_IMAGE_SIZE = 10000
+# File signatures of the image formats Anki shows, and their extensions.
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"BM", ".bmp"),
+)
+
+
+def image_suffix(data: bytes) -> Optional[str]:
+    """Extension of the image `data` starts with, None if it isn't one."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    for signature, suffix in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return suffix
+    return None
+
+
+def google_image_urls(query: str, limit: int):
+    from simple_image_download import simple_image_download as simp
+    return simp.simple_image_download().urls(query, limit)
+
+
+class ImageFetcher():
+    """Downloads the first search result that is an image bigger than
+    `min_size` bytes.
+
+    Candidates are streamed one at a time. Small ones are rejected from
+    their Content-Length or their first bytes, and pages such as hotlink or
+    consent pages from their Content-Type or file signature. Only the
+    accepted image is written to disk, with the extension of its format.
+    """
+
+    def __init__(self,
+                 url_source: Callable[[str, int], Iterable[str]] = google_image_urls,
+                 limit: int = 10,
+                 min_size: int = MIN_IMAGE_SIZE,
+                 images_path: Path = IMAGES_PATH,
+                 chunk_size: int = 1 << 14,
+                 timeout: float = 5,
+                 ):
+        self.url_source = url_source
+        self.limit = limit
+        self.min_size = min_size
+        self.images_path = images_path
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    def _get(self, url: str):
+        return session_registry.get(url, timeout=self.timeout, stream=True,
+                                    allow_redirects=True)
+
+    def _accept(self, response):
+        """Return the extension and first chunks of an acceptable image,
+        otherwise None."""
+        if not response.ok:
+            return None
+        if response.headers.get("Content-Type", "").startswith("text/"):
+            return None
+        length = response.headers.get("Content-Length")
+        if length is not None and length.isdigit() \
+                and int(length) <= self.min_size:
+            return None
+        head = []
+        size = 0
+        chunks = response.iter_content(self.chunk_size)
+        for chunk in chunks:
+            check_deadline()
+            head.append(chunk)
+            size += len(chunk)
+            if size > self.min_size:
+                if suffix := image_suffix(b"".join(head)[:16]):
+                    return suffix, head, chunks
+                return None
+        return None
+
+    def urls(self, query: str):
+        if cassettes.active:
+            return cassettes.value(
+                f"SEARCH {query} {self.limit}",
+                lambda: list(self.url_source(query, self.limit))
+            )
+        return self.url_source(query, self.limit)
+
+    def fetch(self, query: str) -> Optional[Path]:
+        for url in self.urls(query):
+            check_deadline()
+            try:
+                with self._get(url) as response:
+                    if accepted := self._accept(response):
+                        return self._save(query, *accepted)
+            except requests.RequestException as e:
+                print(e)
+        return None
+
+    def _save(self, query: str, suffix: str, head: list, chunks):
+        path = self.images_path / query
+        path.mkdir(parents=True, exist_ok=True)
+        image = path / f"{query}{suffix}"
+        tmp = image.with_suffix(".part")
+        with open(tmp, "wb") as f:
+            for chunk in head:
+                f.write(chunk)
+            for chunk in chunks:
+                check_deadline()
+                f.write(chunk)
+        tmp.replace(image)
+        return image
+
+
+image_fetcher = ImageFetcher()
@@ -0,0 +1,107 @@
+import json
+import os
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+import pandas as pd
+
+
+class Journal():
+    """Append-only JSONL log of finished cards.
+
+    Every card is written as one line and flushed to disk right away, so a
+    run can be interrupted at any point and resumed. A set of the processed
+    keys is kept in memory for O(1) lookups. A torn last line left by a
+    crash is dropped when the journal is reopened.
+    """
+
+    def __init__(self, path: Path, key: str = "original_word"):
+        self.path = Path(path)
+        self.key = key
+        self.keys = set()
+        self.count = 0
+        self._recover()
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    @staticmethod
+    def normalize(key) -> str:
+        return str(key).strip().lower()
+
+    def _recover(self):
+        if not self.path.exists():
+            return
+        valid = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self.keys.add(self.normalize(record.get(self.key)))
+                self.count += 1
+                valid += len(line)
+        if valid != self.path.stat().st_size:
+            print(f"Dropping a torn record at the end of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(valid)
+
+    def __contains__(self, key) -> bool:
+        return self.normalize(key) in self.keys
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, record: dict):
+        self.extend([record])
+
+    def extend(self, records: Iterable[dict]):
+        """Append `records` with a single write and fsync."""
+        records = list(records)
+        self.file.write("".join(json.dumps(r, ensure_ascii=False) + "\n"
+                                for r in records))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.keys.update(self.normalize(r.get(self.key)) for r in records)
+        self.count += len(records)
+
+    def import_csv(self, path: str, columns: List[str],
+                   key: Optional[Callable[[dict], str]] = None):
+        """Seed the journal with the rows of a header-less CSV export.
+
+        `key` gives the journal key of each row when the export has no
+        column for it.
+        """
+        try:
+            df = pd.read_csv(path, names=columns, header=None, index_col=False)
+        except FileNotFoundError:
+            return
+        df = df[df[columns[0]] != columns[0]]
+        records = df.fillna("").to_dict("records")
+        if key is not None:
+            for record in records:
+                record.setdefault(self.key, key(record))
+        self.extend(records)
+
+    def records(self) -> List[dict]:
+        self.file.flush()
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def frame(self, columns: List[str]) -> pd.DataFrame:
+        return pd.DataFrame(self.records(), columns=columns)
+
+    def export_csv(self, path: str, columns: List[str], **kwargs):
+        df = self.frame(columns)
+        df.to_csv(path, index=False, **kwargs)
+        return df
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,18 +1,15 @@
-import os
-import requests
 import json
-from dict_secrets import PONS_SECRET
 from typing import List, Optional
-from bs4 import BeautifulSoup
 from collections import defaultdict
 import pandas as pd
-import shutil
 from copy import copy
-from urllib3.exceptions import MaxRetryError, NewConnectionError
 
 from pathlib import Path
 from utils import pos_processors, word_processing, noun_processing, verb_processing
-from dict_base import DictBase
+from cache import response_cache
+from linguee_backend import linguee_client
+from metrics import metrics
+from senses import Senses, lang_records
 
 
 def process_lang(lang: str):
@@ -23,6 +20,23 @@ def process_lang(lang: str):
         return "de"
 
 
+def split_pos_gender(df: pd.DataFrame, pos_col: str, gender_col: str):
+    """Split values like "noun, masculine" into `pos_col` and `gender_col`."""
+    mask = df[pos_col].str.contains(",", regex=False, na=False)
+    if mask.any():
+        pg = df.loc[mask, pos_col].str.split(",", n=1, expand=True)
+        df.loc[mask, pos_col] = pg[0].str.strip()
+        df.loc[mask, gender_col] = pg[1].str.strip()
+
+
+def split_record_pos_gender(record: dict, pos_col: str, gender_col: str):
+    """`split_pos_gender` for a single record."""
+    pos = record.get(pos_col)
+    if isinstance(pos, str) and "," in pos:
+        pos, gender = pos.split(",", 1)
+        record[pos_col], record[gender_col] = pos.strip(), gender.strip()
+
+
 class LingueeEntries():
     def __init__(self,
                  word: str,
@@ -30,35 +44,37 @@ class LingueeEntries():
                  dst_lang: str = "de",
                  ):
         self.word = word
-        self.api_url = self.get_api_url()
-        self.url = f"{self.api_url}/api/v2/translations?query={word}&src={src_lang}&dst={dst_lang}&guess_direction=true&follow_corrections=always"
-        print(self.url)
+        self.path = f"/api/v2/translations?query={word}&src={src_lang}&dst={dst_lang}&guess_direction=true&follow_corrections=always"
+        print(self.path)
         self.lang_pool = [src_lang, dst_lang]
+        self.lang_pair = f"{src_lang}-{dst_lang}"
         self.entries, self.error = self._get_lin_entries()
         if self.error is None:
             self.langs = [self._get_lang(x) for x in self.entries]
             self._init_processed()
-            self.process_entries()
-
-    def get_api_url(self):
-        try:
-            r = requests.get("http://127.0.0.1:8000")
-            r = r.ok
-        # except (ConnectionError, MaxRetryError, ConnectionRefusedError, NewConnectionError):
-        except:
-            r = False
-        if not r:
-            os.system("uvicorn linguee_api.api:app &")
-        return "http://127.0.0.1:8000"
+            with metrics.stage("parse", word=word, provider="linguee"):
+                self.process_entries()
 
     def _get_lin_entries(self):
-        r = requests.get(self.url).text
+        r = response_cache.fetch("linguee", self.word, self.lang_pair,
+                                 self._request,
+                                 cacheable=lambda x: self._parse(x)[1] is None)
+        return self._parse(r)
+
+    def _request(self):
+        return linguee_client.get(self.path)
+
+    def _parse(self, r: str):
         if r == "Internal Server Error":
             return {}, "server_error"
         r = json.loads(r)
         if isinstance(r, dict):
-            if "The Linguee server returned 503" in r.get("message"):
+            message = r.get("message", "")
+            if "The Linguee server returned 503" in message:
                 return r, "503"
+            if "not found" in message.lower():
+                return r, "not_found"
+            return r, "api_error"
         return r, None
 
     def _get_lang(self, entry):
@@ -130,29 +146,30 @@ class LingueeEntries():
 
     def get_df(self):
         if not self.error:
-            df = pd.DataFrame()
-            for k, v in self.processed_entries.items():
-                # for kk, vv in v.items():
-                #     print(kk)
-                #     print(len(vv))
-                # __import__('pdb').set_trace()
-
-                df_tmp = pd.DataFrame(v)
-                df_tmp["lang"] = k
-                df = pd.concat([df, df_tmp])
+            frames = [pd.DataFrame(v).assign(lang=k)
+                      for k, v in self.processed_entries.items()]
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
             df["gender_src"] = ""
             df["gender_dst"] = ""
-            for ix, row in df.iterrows():
-                if "," in row.pos:
-                    pg = [x.strip() for x in row.pos.split(",")]
-                    df.loc[ix, "pos"], df.loc[ix, "gender_src"] = pg
-                if "," in row.pos_dst:
-                    pg = [x.strip() for x in row.pos_dst.split(",")]
-                    df.loc[ix, "pos_dst"], df.loc[ix, "gender_dst"] = pg
+            if not df.empty:
+                split_pos_gender(df, "pos", "gender_src")
+                split_pos_gender(df, "pos_dst", "gender_dst")
             return df, self.error
         else:
             return pd.DataFrame(), self.error
 
+    def get_senses(self):
+        """`get_df` as Senses, without building a frame."""
+        if self.error:
+            return Senses(), self.error
+        records = []
+        for record in lang_records(self.processed_entries):
+            record["gender_src"] = record["gender_dst"] = ""
+            split_record_pos_gender(record, "pos", "gender_src")
+            split_record_pos_gender(record, "pos_dst", "gender_dst")
+            records.append(record)
+        return Senses.from_records(records), self.error
+
     def __call__(self):
         return self.get_df()
 
@@ -0,0 +1,116 @@
+import subprocess
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from batch import rate_gate
+from cassettes import cassettes
+from deadline import DICT_TIMEOUT, request_timeout
+from sessions import session_registry
+
+
+LINGUEE_URL = "http://127.0.0.1:8000"
+READY_TIMEOUT = 30
+
+
+class LingueeClient():
+    """Process-wide access to linguee-api.
+
+    The backend is resolved once, on first use. An already running server
+    is used through the host's pooled session; otherwise the app is called
+    in-process through starlette's ASGI test client when linguee_api is
+    importable, and only as a last resort a single uvicorn server is started
+    and waited for. If that fails too, later lookups fail right away instead
+    of starting the server again.
+
+    Requests go through the cassettes once, in `get`; the session itself is
+    a plain one, so readiness probes are never recorded.
+    """
+
+    def __init__(self, url: str = LINGUEE_URL,
+                 ready_timeout: float = READY_TIMEOUT):
+        self.url = url
+        self.ready_timeout = ready_timeout
+        self.session = None
+        self.failure = None
+        self.process = None
+        self._lock = threading.Lock()
+
+    def _http_session(self):
+        return session_registry.session(session_registry.resolve(self.url))
+
+    def _is_ready(self):
+        url = session_registry.resolve(self.url)
+        try:
+            return self._http_session().get(url, timeout=1).ok
+        except requests.RequestException:
+            return False
+
+    def _in_process_session(self):
+        try:
+            from linguee_api.api import app
+            from starlette.testclient import TestClient
+        except ImportError:
+            return None
+        return TestClient(app, base_url=self.url,
+                          raise_server_exceptions=False)
+
+    def _start_server(self):
+        url = urlparse(self.url)
+        try:
+            self.process = subprocess.Popen(
+                ["uvicorn", "linguee_api.api:app",
+                 "--host", url.hostname, "--port", str(url.port)]
+            )
+        except FileNotFoundError:
+            raise ConnectionError("Linguee API is not running and uvicorn is not installed")
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            if self._is_ready():
+                return
+            time.sleep(0.2)
+        raise ConnectionError(f"Linguee API is not available at {self.url}")
+
+    def connect(self):
+        with self._lock:
+            if self.session is not None:
+                return self.session
+            if self.failure is not None:
+                raise self.failure
+            session = self._http_session()
+            if not self._is_ready():
+                if in_process := self._in_process_session():
+                    session = in_process
+                else:
+                    try:
+                        self._start_server()
+                    except ConnectionError as e:
+                        self.failure = e
+                        raise
+            self.session = session
+            return session
+
+    def get(self, path: str):
+        url = f"{self.url}{path}"
+        if cassettes.active:
+            return cassettes.get(url, DICT_TIMEOUT, self._send)
+        return self._send(url, DICT_TIMEOUT)
+
+    def _send(self, url: str, timeout: float):
+        rate_gate()
+        return self.connect().get(session_registry.resolve(url),
+                                  timeout=request_timeout(timeout))
+
+    def close(self):
+        self.session = None
+        self.failure = None
+        if self.process is not None:
+            self.process.terminate()
+            self.process = None
+
+
+linguee_client = LingueeClient()
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from utils import downloadimages, get_audio
+from media_store import media_store
+from metrics import metrics
+from cassettes import cassettes
+
+
+MEDIA_WORKERS = 4
+
+
+@dataclass(frozen=True)
+class ImageRequest():
+    query: str
+    collections_path: Path
+
+
+@dataclass(frozen=True)
+class AudioRequest():
+    url: str
+    word: str
+    collections_path: Path
+
+
+def fetch_image(request: ImageRequest):
+    with metrics.stage("image", word=request.query), \
+            cassettes.word(request.query):
+        image_path = downloadimages(request.query)
+    img_name = image_path.parent.stem + image_path.suffix
+    media_store.place_file(image_path, request.collections_path / img_name)
+    return f"<img src='{img_name}'>"
+
+
+def fetch_audio(request: AudioRequest):
+    with metrics.stage("audio", word=request.word), \
+            cassettes.word(request.word):
+        return get_audio(audio_url=request.url,
+                         word=request.word,
+                         collections_path=request.collections_path)
+
+
+def fetch(request):
+    if isinstance(request, ImageRequest):
+        return fetch_image(request)
+    return fetch_audio(request)
+
+
+class MediaStage():
+    """Fetches the picture and audio of finished cards in parallel.
+
+    Cards are the dicts returned by `SingleEntry.get_dict` or
+    `DictCombine.resolved`. Their `image_request` and `audio_request` are
+    fetched once each and stored as `picture` and `audio`.
+    """
+
+    def __init__(self, workers: int = MEDIA_WORKERS):
+        self.workers = workers
+
+    def fetch(self, requests: list):
+        requests = list(dict.fromkeys(requests))
+        if self.workers <= 1 or len(requests) <= 1:
+            results = [self._fetch(r) for r in requests]
+        else:
+            with ThreadPoolExecutor(self.workers) as executor:
+                results = list(executor.map(self._fetch, requests))
+        return dict(zip(requests, results))
+
+    @staticmethod
+    def _fetch(request):
+        try:
+            return fetch(request)
+        except Exception as e:
+            print(f"Couldn't fetch {request}: {e!r}")
+            return ""
+
+    def apply(self, cards: List[Optional[dict]]):
+        cards = [c for c in cards if c]
+        requests = [c[k] for c in cards
+                    for k in ("image_request", "audio_request") if c.get(k)]
+        results = self.fetch(requests)
+        for card in cards:
+            if image_request := card.get("image_request"):
+                card["picture"] = results[image_request]
+            if audio_request := card.get("audio_request"):
+                card["audio"] = results[audio_request]
+        return cards
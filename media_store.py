@@ -0,0 +1,100 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+
+STORE_PATH = Path("media_store")
+# ioctl request cloning a whole file on copy-on-write filesystems (Linux).
+FICLONE = 0x40049409
+
+
+def current_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# mkstemp creates files as 0600, stored files get the usual mode instead.
+FILE_MODE = 0o644 & ~current_umask()
+
+
+def file_hash(path: Path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def reflink(src: Path, dst: Path):
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+class MediaStore():
+    """Content-addressed store of downloaded images and audio.
+
+    Every file is kept once under its sha256 and placed into Anki's
+    collection.media by hardlink, reflink or, as a last resort, copy.
+    """
+
+    def __init__(self, path: Path = STORE_PATH):
+        self.path = path
+
+    def _stored_path(self, digest: str, suffix: str):
+        return self.path / digest[:2] / f"{digest}{suffix}"
+
+    def _add(self, write, digest: str, suffix: str):
+        stored = self._stored_path(digest, suffix)
+        if not stored.exists():
+            stored.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=stored.parent)
+            os.close(fd)
+            try:
+                write(Path(tmp))
+                os.chmod(tmp, FILE_MODE)
+                os.replace(tmp, stored)
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+        return stored
+
+    def add_file(self, src: Path):
+        src = Path(src)
+        return self._add(lambda tmp: shutil.copyfile(src, tmp),
+                         file_hash(src), src.suffix)
+
+    def add_bytes(self, data: bytes, suffix: str):
+        return self._add(lambda tmp: tmp.write_bytes(data),
+                         hashlib.sha256(data).hexdigest(), suffix)
+
+    def link(self, stored: Path, dst: Path):
+        """Place `stored` at `dst` unless the same content is already there."""
+        if dst.exists():
+            if os.path.samefile(stored, dst):
+                return dst
+            if dst.stat().st_size == stored.stat().st_size and \
+                    file_hash(dst) == stored.stem:
+                return dst
+            dst.unlink()
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(stored, dst)
+        except OSError:
+            try:
+                reflink(stored, dst)
+            except OSError:
+                shutil.copyfile(stored, dst)
+        return dst
+
+    def place_file(self, src: Path, dst: Path):
+        return self.link(self.add_file(src), dst)
+
+    def place_bytes(self, data: bytes, suffix: str, dst: Path):
+        return self.link(self.add_bytes(data, suffix), dst)
+
+
+media_store = MediaStore()
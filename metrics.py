@@ -0,0 +1,189 @@
+import bisect
+import contextlib
+import functools
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+NAMESPACE = "anki_dict"
+# Upper bounds in seconds of the latency histogram buckets.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def label_key(labels: dict):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+def format_labels(labels: tuple, **extra):
+    labels = labels + tuple(extra.items())
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in labels) + "}"
+
+
+class Histogram():
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for le, n in zip(self.buckets + ("+Inf",), self.counts):
+            total += n
+            yield le, total
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.sum,
+                "buckets": {str(le): n for le, n in self.cumulative()}}
+
+
+class Metrics():
+    """Counters and latency histograms of the lookup stages.
+
+    `stage` times a block under a stage name and labels like the provider;
+    exceptions raised inside are counted as stage errors. Lookup errors
+    ("503", "server_error", "empty", ...) are counted with `error`. With
+    `trace_to` every timed stage is also written as a JSON line together
+    with the word it was working on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trace = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, label_key(labels))
+        with self._lock:
+            if (histogram := self.histograms.get(key)) is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def error(self, provider: str, kind: str):
+        self.inc("lookup_errors_total", provider=provider, kind=kind)
+
+    @contextlib.contextmanager
+    def stage(self, name: str, word: Optional[str] = None, **labels):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            self.inc("stage_errors_total", stage=name, kind=error, **labels)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("stage_seconds", seconds, stage=name, **labels)
+            if self._trace is not None:
+                self._write_trace({"time": time.time(), "word": word,
+                                   "stage": name, **labels,
+                                   "seconds": round(seconds, 6),
+                                   "error": error})
+
+    def timed(self, name: str, **labels):
+        """Decorator timing every call of a function as stage `name`."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def trace_to(self, path: Optional[Path]):
+        """Append per-word trace lines to `path`, or stop tracing with None."""
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+            self._trace = open(path, "a") if path is not None else None
+
+    def _write_trace(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._trace is not None:
+                self._trace.write(line)
+                self._trace.flush()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels),
+                              "value": value}
+                             for (name, labels), value in self.counters.items()],
+                "histograms": [{"name": name, "labels": dict(labels),
+                                **histogram.to_dict()}
+                               for (name, labels), histogram
+                               in self.histograms.items()],
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {NAMESPACE}_{name} counter")
+                for (n, labels), value in self.counters.items():
+                    if n == name:
+                        lines.append(f"{NAMESPACE}_{name}"
+                                     f"{format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {NAMESPACE}_{name} histogram")
+                for (n, labels), histogram in self.histograms.items():
+                    if n != name:
+                        continue
+                    for le, count in histogram.cumulative():
+                        lines.append(f"{NAMESPACE}_{name}_bucket"
+                                     f"{format_labels(labels, le=le)} {count}")
+                    lines.append(f"{NAMESPACE}_{name}_sum"
+                                 f"{format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{NAMESPACE}_{name}_count"
+                                 f"{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str = "metrics"):
+        """Write `<path>.json` and `<path>.prom`."""
+        with open(f"{path}.json", "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        with open(f"{path}.prom", "w") as f:
+            f.write(self.to_prometheus())
+
+    def summary(self):
+        """Count and total seconds of every stage, slowest first."""
+        with self._lock:
+            rows = [(dict(labels), h.count, h.sum)
+                    for (name, labels), h in self.histograms.items()
+                    if name == "stage_seconds"]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return "\n".join(
+            f"  {' '.join(f'{k}={v}' for k, v in labels.items()):<40} "
+            f"{count:6d} x {total / count * 1000:9.3f} ms = {total:8.3f} s"
+            for labels, count, total in rows
+        )
+
+
+metrics = Metrics()
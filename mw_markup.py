@@ -0,0 +1,87 @@
+# Merriam-Webster text markup, see
+# https://dictionaryapi.com/products/json#sec-2.tokens
+
+SMALL_CAPS = ('<span style="font-variant: small-caps">', "</span>")
+
+# Paired tokens and the HTML they open and close with.
+TAGS = {
+    "b": ("<b>", "</b>"),
+    "it": ("<i>", "</i>"),
+    "wi": ("<i>", "</i>"),
+    "qword": ("<i>", "</i>"),
+    "phrase": ("<b><i>", "</i></b>"),
+    "parahw": ("<b>", "</b>"),
+    "inf": ("<sub>", "</sub>"),
+    "sup": ("<sup>", "</sup>"),
+    "sc": SMALL_CAPS,
+    "gloss": ("[", "]"),
+}
+# Standalone tokens. The bold colon is dropped, cards show no headword.
+MARKS = {
+    "bc": "",
+    "ldquo": "“",
+    "rdquo": "”",
+}
+# Cross-reference groups, dropped with everything inside them.
+HIDDEN = {"dx", "dx_def", "dx_ety", "ma"}
+# Link tokens `{name|field|...}`, rendered as their first field.
+LINKS = {
+    "a_link": ("", ""),
+    "d_link": ("", ""),
+    "i_link": ("<i>", "</i>"),
+    "et_link": ("", ""),
+    "mat": ("", ""),
+    "sx": SMALL_CAPS,
+    "dxt": ("", ""),
+}
+
+
+def token_table(italics: bool = True):
+    """HTML of every token without fields, by token name."""
+    table = dict(MARKS)
+    for name, (open_tag, close_tag) in TAGS.items():
+        if name == "it" and not italics:
+            open_tag = close_tag = ""
+        table[name] = open_tag
+        table[f"/{name}"] = close_tag
+    return table
+
+
+TABLE = token_table()
+PLAIN_TABLE = token_table(italics=False)
+
+
+def render(text: str, italics: bool = True):
+    """Render MW markup in `text` to HTML in one pass.
+
+    Unknown tokens are dropped. Without `italics`, `{it}` is dropped too,
+    for text that is set in italics as a whole.
+    """
+    if "{" not in text:
+        return text
+    table = TABLE if italics else PLAIN_TABLE
+    parts = text.split("{")
+    html = [parts[0]]
+    # Closing token of the hidden group being skipped.
+    hidden = None
+    for part in parts[1:]:
+        token, closed, rest = part.partition("}")
+        if hidden is not None:
+            if token == hidden:
+                hidden = None
+                html.append(rest)
+            continue
+        if not closed:
+            html.append("{" + part)
+            continue
+        if (rendered := table.get(token)) is None:
+            name, _, fields = token.partition("|")
+            if name in HIDDEN:
+                hidden = f"/{name}"
+                continue
+            link = LINKS.get(name)
+            rendered = f"{link[0]}{fields.split('|')[0]}{link[1]}" \
+                if link and fields else ""
+        html.append(rendered)
+        html.append(rest)
+    return "".join(html)
@@ -1,9 +1,14 @@
 import requests
 import json
 from dict_secrets import PONS_SECRET
-from bs4 import BeautifulSoup
 from collections import defaultdict
+import numpy as np
 import pandas as pd
+from cache import response_cache
+from sessions import session_registry
+from pons_fragment import Fragment
+from metrics import metrics
+from senses import NAN, Senses, isnull, lang_records
 
 
 class PonsEntries():
@@ -12,18 +17,35 @@ class PonsEntries():
                  src_lang: str = "en",
                  dst_lang: str = "de",
                  ):
+        self.word = word
+        self.lang_pair = f"{src_lang}-{dst_lang}"
         self.url = f"https://api.pons.com/v1/dictionary?l={dst_lang}{src_lang}&q={word}"
         self.entries = self.get_entries()
         self.langs = [x['lang'] for x in self.entries]
         self._init_processed()
-        self.process_entries()
+        with metrics.stage("parse", word=word, provider="pons"):
+            self.process_entries()
 
     def get_entries(self):
-        if r := requests.get(self.url, headers={"X-Secret": PONS_SECRET}).text:
+        if r := response_cache.fetch("pons", self.word, self.lang_pair,
+                                     self._request):
             return json.loads(r)
         else:
             return r
 
+    def _request(self):
+        response = session_registry.get(self.url,
+                                        headers={"X-Secret": PONS_SECRET})
+        # 204 is PONS' answer for a word without entries. Errors and empty
+        # bodies (throttling) are raised, so they are never taken for misses.
+        if response.status_code == 204:
+            return response
+        response.raise_for_status()
+        if not response.text.strip():
+            raise requests.HTTPError(f"Empty response from PONS for {self.word}",
+                                     response=response)
+        return response
+
     def _init_processed(self):
         self.processed_entries = {}
         for lang in self.langs:
@@ -56,25 +78,10 @@ class PonsEntries():
         self.processed_entries[lang]["headword"].extend([rom["headword"]] * n)
 
     def process_headword_full(self, lang: str, rom: dict, n: int):
-        hf = rom["headword_full"]
-        hf = BeautifulSoup(hf, features="lxml")
-        if span := hf.find("span", {"class": "flexion"}):
-            flexion = span.text
-        else:
-            flexion = ""
-        if span := hf.find("span", {"class": "phonetics"}):
-            phonetics = span.text
-        else:
-            phonetics = ""
-        if span := hf.find("span", {"class": "genus"}):
-            if acronym := span.find("acronym"):
-                gender = acronym.get("title")
-            else:
-                gender = span.get("title")
-            if not gender:
-                gender = span.text
-        else:
-            gender = ""
+        hf = Fragment(rom["headword_full"])
+        flexion = hf.span("flexion")
+        phonetics = hf.span("phonetics")
+        gender = hf.gender
         # if span := hf.find("span", {"class": "wordclass"}):
         #     pos = span.acronym.get("title")
         # else:
@@ -98,7 +105,7 @@ class PonsEntries():
         self.processed_entries[lang]["examples_src"].append("")
         self.processed_entries[lang]["examples_dst"].append("")
 
-        headword = BeautifulSoup(hit["source"], features="lxml").text
+        headword = Fragment(hit["source"]).text
         self.processed_entries[lang]["headword"].append(headword)
         self.processed_entries[lang]["hit"].append(0)
         self.processed_entries[lang]["flexion"].append("")
@@ -109,19 +116,14 @@ class PonsEntries():
         self.processed_entries[lang]["entry"].append(iy)
 
     def process_translation(self, trans: str, lang: str, wc: str = ""):
-        trans = BeautifulSoup(trans, features="lxml")
+        trans = Fragment(trans)
         target = trans.text
         gender = ""
         if wc == "noun" and lang in ["en"]:  # TODO tmp solution, works only if we translate from english to a language that has noun genders
             sp = target.split()
             target = " ".join(sp[:-1])
             gender = sp[-1]
-        target_desc = ""
-        if span := trans.find("span"):
-            if acronym := span.get("acronym"):
-                target_desc = acronym.get("title")
-        elif acronym := trans.acronym:
-            target_desc = acronym.get("title")
+        target_desc = trans.target_desc
         self.processed_entries[lang]["target"].append(target)
         self.processed_entries[lang]["gender_dst"].append(gender)
         self.processed_entries[lang]["target_desc"].append(target_desc)
@@ -129,11 +131,7 @@ class PonsEntries():
 
     def process_arab(self, lang: str, arab: dict, wc: str):
         # Sens
-        sens = BeautifulSoup(arab["header"], features="lxml")
-        if span := sens.find("span", {"class": "sense"}):
-            sense = span.text
-        else:
-            sense = ""
+        sense = Fragment(arab["header"]).span("sense")
         self.processed_entries[lang]["sense"].append(sense)
         # if wc != "noun":
         #     __import__('pdb').set_trace()
@@ -149,11 +147,8 @@ class PonsEntries():
         examples_dst1 = []
         examples_dst2 = []
         for tran in arab["translations"][1:]:
-            src = BeautifulSoup(tran["source"], features="lxml")
-            src = src.text
-
-            dst = BeautifulSoup(tran["target"], features="lxml")
-            dst = dst.text
+            src = Fragment(tran["source"]).text
+            dst = Fragment(tran["target"]).text
             if target.lower() in [x.lower() for x in dst.split()]:
                 examples_src1.append(src.strip())
                 examples_dst1.append(dst.strip())
@@ -172,49 +167,67 @@ class PonsEntries():
         self.processed_entries[lang]["examples_src"].append("<br>".join(examples_src[:2]))
         self.processed_entries[lang]["examples_dst"].append("<br>".join(examples_dst[:2]))
         
-    def __both_empty_and_not(self, series: pd.Series):
-        are_there_nulls = series.isnull().any()
-        are_there_empty_strings = any(series == "")
-        are_there_nulls = are_there_nulls or are_there_empty_strings
-        are_there_values = not series.isnull().all()
-        are_there_value_strings = not all(series == "")
-        are_there_values = are_there_values and are_there_value_strings
-        return are_there_nulls and are_there_values
-
-    def __interpolate(self, series: pd.Series):
-        series.loc[series == ""] = None
-        # series.ffill()
-        series.interpolate("pad", inplace=True)
-        return series
-
-
     def __interpolate_gf(self, df):
-        """Interpolate gender and felxion values."""
-        pos = df.pos.drop_duplicates().to_list()
-        new_df = pd.DataFrame()
-        for p in pos:
-            df_pos = df.loc[df.pos == p]
-            if self.__both_empty_and_not(df_pos.flexion):
-                df_pos.flexion = self.__interpolate(df_pos.flexion)
-            if self.__both_empty_and_not(df_pos.gender_src):
-                df_pos.gender_src = self.__interpolate(df_pos.gender_src)
-            if self.__both_empty_and_not(df_pos.gender_dst):
-                df_pos.gender_dst = self.__interpolate(df_pos.gender_dst)
-            new_df = pd.concat([new_df, df_pos])
-        return new_df
-
+        """Interpolate gender and felxion values.
+
+        Within every part of speech a column that mixes empty and non-empty
+        values is forward filled; rows come out grouped by part of speech in
+        order of first appearance.
+        """
+        codes, _ = pd.factorize(df.pos)
+        df = df.iloc[np.argsort(codes, kind="stable")].copy()
+        pos = df.pos.to_numpy()
+        cols = ["flexion", "gender_src", "gender_dst"]
+        values = df[cols]
+        nulls = values.isnull()
+        empty_strings = values == ""
+        empty = nulls | empty_strings
+        by_pos = lambda frame: frame.groupby(pos, sort=False)
+        are_there_values = ~by_pos(nulls).transform("all") & \
+            ~by_pos(empty_strings).transform("all")
+        mixed = by_pos(empty).transform("any") & are_there_values
+        filled = by_pos(values.mask(empty_strings)).ffill()
+        df[cols] = values.mask(mixed, filled)
+        return df
+
+    @staticmethod
+    def __interpolate_gf_records(records: list):
+        """`__interpolate_gf` for records."""
+        groups = {}
+        for record in records:
+            groups.setdefault(record["pos"], []).append(record)
+        for group in groups.values():
+            for col in ("flexion", "gender_src", "gender_dst"):
+                values = [record.get(col, NAN) for record in group]
+                nulls = [isnull(v) for v in values]
+                empty_strings = [v == "" for v in values]
+                # Only columns mixing empty and non-empty values are filled.
+                if all(nulls) or all(empty_strings) or \
+                        not any(nulls) and not any(empty_strings):
+                    continue
+                last = NAN
+                for record, value, empty_string in zip(group, values,
+                                                       empty_strings):
+                    if empty_string or isnull(value):
+                        value = last
+                    last = value
+                    record[col] = value
+        return [record for group in groups.values() for record in group]
+
+    def get_senses(self):
+        """`get_df` as Senses, without building a frame."""
+        records = list(lang_records(self.processed_entries))
+        if not records:
+            return Senses(), "empty"
+        records = self.__interpolate_gf_records(records)
+        records = [record for record in records
+                   if not isnull(record.get("target")) and record["target"] != ""]
+        return Senses.from_records(records), None
 
     def get_df(self):
-        df = pd.DataFrame()
-        for k, v in self.processed_entries.items():
-            # for kk, vv in v.items():
-            #     print(kk)
-            #     print(len(vv))
-            # __import__('pdb').set_trace()
-
-            df_tmp = pd.DataFrame(v)
-            df_tmp["lang"] = k
-            df = pd.concat([df, df_tmp])
+        frames = [pd.DataFrame(v).assign(lang=k)
+                  for k, v in self.processed_entries.items()]
+        df = pd.concat(frames) if frames else pd.DataFrame()
 
         if not df.empty:
             df = self.__interpolate_gf(df)
@@ -0,0 +1,156 @@
+import re
+from html import unescape
+
+
+# Tags, comments/declarations and text runs of a PONS HTML fragment.
+TOKEN = re.compile(
+    r"<!--.*?(?:-->|$)"
+    r"|<(/?)([A-Za-z][^\s/>]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>"
+    r"|<[!?][^>]*>"
+    r"|([^<]+|<)",
+    re.S
+)
+ATTR = re.compile(
+    r"([^\s=/>]+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+)))?"
+)
+ASCII_SPACES = " \t\n\r\f"
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+             "link", "meta", "param", "source", "track", "wbr"}
+SPAN_CLASSES = ("flexion", "phonetics", "genus", "sense")
+MISSING = object()
+
+
+def parse_attrs(attrs: str):
+    parsed = {}
+    for m in ATTR.finditer(attrs):
+        name = m[1].lower()
+        if name not in parsed:
+            value = next((v for v in m.groups()[1:] if v is not None), "")
+            parsed[name] = unescape(value)
+    return parsed
+
+
+class Fragment():
+    """Text and the PONS specific spans of an HTML fragment.
+
+    Mirrors what PonsEntries used to read from a BeautifulSoup(lxml) tree:
+    `text` is the tree's `.text`, `spans` maps each class of SPAN_CLASSES to
+    the text of the first span with that class.
+    """
+    __slots__ = ("text", "spans", "has_span", "acronym", "genus_title",
+                 "genus_acronym")
+
+    def __init__(self, html: str):
+        self.spans = {}
+        self.has_span = False
+        self.acronym = MISSING
+        self.genus_title = None
+        self.genus_acronym = MISSING
+        parts = []
+        # Stack of open tags, each with the span classes it captures.
+        stack = []
+        captures = {}
+        # Text is buffered because stray closing tags do not split it.
+        pending = []
+        started = False
+        stray = False
+        fold = False
+
+        def flush():
+            nonlocal fold
+            text = "".join(pending)
+            pending.clear()
+            if fold:
+                fold = False
+                stripped = text.lstrip(ASCII_SPACES)
+                leading = text[:len(text) - len(stripped)]
+                if stripped and leading:
+                    text = ("\n" if "\n" in leading else " ") + stripped
+            text = unescape(text.replace("\r\n", "\n").replace("\r", "\n"))
+            if not text.strip(ASCII_SPACES):
+                text = "\n" if "\n" in text else " "
+            parts.append(text)
+            for capture in captures.values():
+                capture.append(text)
+
+        for m in TOKEN.finditer(html):
+            closing, tag, attrs, text = m.groups()
+            if text is not None:
+                if not started:
+                    # libxml2 drops leading blanks, or folds them into one
+                    # character after a stray closing tag.
+                    if not stray:
+                        text = text.lstrip(ASCII_SPACES)
+                        if not text:
+                            continue
+                    fold = stray
+                    started = True
+                pending.append(text)
+                continue
+            if tag is not None:
+                tag = tag.lower()
+                if closing and not any(t == tag for t, _ in stack):
+                    stray = True
+                    continue
+            if pending:
+                flush()
+            if tag is None:
+                continue
+            started = True
+            if closing:
+                for ix in range(len(stack) - 1, -1, -1):
+                    if stack[ix][0] == tag:
+                        for _, keys in stack[ix:]:
+                            for key in keys:
+                                self.spans[key] = "".join(captures.pop(key))
+                        del stack[ix:]
+                        break
+                continue
+            keys = []
+            if tag == "span":
+                attrs = parse_attrs(attrs)
+                self.has_span = True
+                classes = attrs.get("class", "").split()
+                for cls in SPAN_CLASSES:
+                    if cls in classes and cls not in self.spans \
+                            and cls not in captures:
+                        captures[cls] = []
+                        keys.append(cls)
+                        if cls == "genus":
+                            self.genus_title = attrs.get("title")
+            elif tag == "acronym":
+                title = parse_attrs(attrs).get("title")
+                if self.acronym is MISSING:
+                    self.acronym = title
+                if "genus" in captures and self.genus_acronym is MISSING:
+                    self.genus_acronym = title
+            if tag not in VOID_TAGS:
+                stack.append((tag, keys))
+        if pending:
+            flush()
+        for key, capture in captures.items():
+            self.spans[key] = "".join(capture)
+        self.text = "".join(parts)
+
+    def span(self, cls: str):
+        return self.spans.get(cls, "")
+
+    @property
+    def gender(self):
+        if "genus" not in self.spans:
+            return ""
+        if self.genus_acronym is not MISSING:
+            gender = self.genus_acronym
+        else:
+            gender = self.genus_title
+        if not gender:
+            gender = self.spans["genus"]
+        return gender
+
+    @property
+    def target_desc(self):
+        if self.has_span:
+            return ""
+        if self.acronym is not MISSING:
+            return self.acronym
+        return ""
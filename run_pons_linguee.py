@@ -1,7 +1,12 @@
-import time
 from typing import Optional
+import argparse
 import pandas as pd
 from dict_combine import DictCombine, TooManyRequestsError
+from cache import negative_cache, response_cache
+from media import MEDIA_WORKERS
+from journal import Journal
+from metrics import metrics
+from cassettes import CASSETTES_PATH, RECORD, REPLAY, use_cassettes
 from pathlib import Path
 
 import warnings
@@ -34,7 +39,15 @@ def prepare_csv(csv: str):
     return df
 
 
-def run(csv: Optional[str] = None, save_csv: str = "ready_for_anki.csv"):
+def run(csv: Optional[str] = None, save_csv: str = "ready_for_anki.csv",
+        batch_size: int = 20, media_workers: int = MEDIA_WORKERS,
+        trace: Optional[str] = None):
+    """Look up the words and save their cards to `save_csv`.
+
+    Stage metrics are written next to it as `.metrics.json` and
+    `.metrics.prom`; `trace` appends a JSON line per word and stage.
+    """
+    metrics.trace_to(trace)
     if csv is None:
         df = get_reactor_df()
         source = "Language Factory"
@@ -42,51 +55,62 @@ def run(csv: Optional[str] = None, save_csv: str = "ready_for_anki.csv"):
         df = prepare_csv(csv)
         source = "manual"
 
-    try:
-        ready_for_anki = pd.read_csv(save_csv, names=FINAL_COLS, header=None)
-    except FileNotFoundError:
-        ready_for_anki = pd.DataFrame()
-    ready_entries = []
-    for ix, row in df.loc[df.item_type == "Word"].iterrows():
-        print(ix)
-        print(row.word)
-        
-        # 42
-        # 435
-        # if ix < 435:
-        #     continue
+    with Journal(Path(save_csv).with_suffix(".jsonl")) as journal:
+        if not len(journal):
+            journal.import_csv(save_csv, FINAL_COLS)
+        # Lemmas repeated in the input are looked up once.
+        rows = {}
+        for _, row in df.loc[df.item_type == "Word"].iterrows():
+            if row.lemma not in journal:
+                rows.setdefault(Journal.normalize(row.lemma), row)
+        rows = list(rows.values())
 
-        if not ready_for_anki.empty:
-#             import pdb; pdb.set_trace()
-            if row.lemma.lower() in ready_for_anki.original_word.to_list():
-                continue
-        example_src = row.subtitle if "..." not in row.subtitle else ""
-        example_dst = row.translation if "..." not in  row.translation else ""
-        ready_entry = DictCombine.init(word=row.lemma,
-                                       input_lang="de",
-                                       dicts_to_use=["pons", "linguee"],
-                                       pos=row.part_of_speech.lower(),
-                                       external_example_dst=example_dst,
-                                       external_example_src=example_src,
-                                       source=source
-                                       )
-        ready_entry, errors = ready_entry()
-        if not ready_entry:
-            print(f"No entry for {row.word}") # Add ingore list
-            continue
-        if "503" in errors:
-            raise TooManyRequestsError("Linguee too many requests error.")
-        ready_entries.append(ready_entry)
-        time.sleep(10)
-        if ix % 2 == 1:
-#             import pdb; pdb.set_trace()
-            df_tmp = pd.DataFrame(ready_entries)
-            ready_entries = []
-            ready_for_anki = ready_for_anki.append(df_tmp)
-            ready_for_anki.to_csv(save_csv, index=False)
-    df_tmp = pd.DataFrame(ready_entries)
-    ready_for_anki = ready_for_anki.append(df_tmp)
-    ready_for_anki.to_csv(save_csv, index=False, header=None)
+        try:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                words = []
+                for row in batch:
+                    print(row.word)
+                    example_src = row.subtitle if "..." not in row.subtitle else ""
+                    example_dst = row.translation if "..." not in  row.translation else ""
+                    words.append({"word": row.lemma,
+                                  "pos": row.part_of_speech.lower(),
+                                  "external_example_dst": example_dst,
+                                  "external_example_src": example_src})
+                ready_batch = DictCombine.init_many(words,
+                                                    dicts_to_use=["pons", "linguee"],
+                                                    media_workers=media_workers,
+                                                    input_lang="de",
+                                                    source=source)
+                for row, ready_entry in zip(batch, ready_batch):
+                    ready_entry, errors = ready_entry()
+                    if not ready_entry:
+                        print(f"No entry for {row.word}") # Add ingore list
+                        continue
+                    if "503" in errors:
+                        raise TooManyRequestsError("Linguee too many requests error.")
+                    journal.append(ready_entry)
+        finally:
+            journal.export_csv(save_csv, FINAL_COLS, header=None)
+            metrics.export(str(Path(save_csv).with_suffix(".metrics")))
+            metrics.trace_to(None)
+    print(f"Response cache: {response_cache.stats()}")
+    print(f"Negative cache: {negative_cache.stats()}")
+    print(f"Stages:\n{metrics.summary()}")
 
 if __name__ == "__main__":
-    run(save_csv="ready_for_anki3.csv")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", help="words to look up instead of the Language Reactor export")
+    parser.add_argument("--trace", help="append per-word stage timings to this file")
+    parser.add_argument("--cassettes", choices=[RECORD, REPLAY],
+                        help="record provider traffic per word, or replay it offline")
+    parser.add_argument("--cassette-dir", default=CASSETTES_PATH, type=Path)
+    parser.add_argument("--latency", type=float, default=0,
+                        help="seconds added to every replayed response")
+    parser.add_argument("--latency-scale", type=float, default=0,
+                        help="replay this fraction of each recorded response time")
+    args = parser.parse_args()
+    if args.cassettes:
+        use_cassettes(args.cassettes, args.cassette_dir, args.latency,
+                      args.latency_scale)
+    run(csv=args.csv, save_csv="ready_for_anki3.csv", trace=args.trace)
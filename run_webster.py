@@ -1,15 +1,22 @@
-from typing import List
+from typing import TYPE_CHECKING, List, Optional
 import pandas as pd
-from bs4 import BeautifulSoup
+import re
 import time
 from copy import copy
 import argparse
+from pathlib import Path
 
-from selenium import webdriver
 from dict_entry import TwoEntries, AllEntries
+from cache import negative_cache, response_cache
+from journal import Journal
+from metrics import metrics
+from cassettes import CASSETTES_PATH, RECORD, REPLAY, use_cassettes
 
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
-def get_words(soup: List[BeautifulSoup]):
+
+def get_words(soup: List["BeautifulSoup"]):
     words = []
     for s in soup:
         a = s.find("a")
@@ -22,6 +29,7 @@ def get_words(soup: List[BeautifulSoup]):
 
 
 def process_words(driver):
+    from bs4 import BeautifulSoup
     new_words = []
     soup = BeautifulSoup(driver.page_source)
 #     import pdb; pdb.set_trace()
@@ -35,6 +43,7 @@ def process_words(driver):
 
 
 def get_saved_words(driver, df):
+    from bs4 import BeautifulSoup
     driver.get("https://www.merriam-webster.com/saved-words")
     time.sleep(10)
     saved_words = []
@@ -66,6 +75,8 @@ def get_saved_words(driver, df):
 
 
 def run_scraper():
+    # Selenium is only needed for scraping, keep `run_definitions` light.
+    from selenium import webdriver
     chrome_options = webdriver.ChromeOptions()
     chrome_options.add_argument("--window-size=1366,768")
     chrome_options.add_experimental_option('prefs', {'intl.accept_languages': 'en,en_US'})
@@ -83,6 +94,26 @@ def run_scraper():
     new_df.to_csv("webster_saved_words.csv", index=None)
 
 
+WEBSTER_COLS = ["Word", "Picture", "Definition", "Audio",
+                "Part of speech", "Sample sentence", "Original word"]
+SHUFFLE_SEED = 0
+# Journal key: the saved word a card was made from, not its headword.
+SAVED_WORD = "Saved word"
+
+
+def saved_word(original_word: str):
+    """Saved word a card's "Original word" was made from.
+
+    "to run (verb)" and "run (noun) 2" both come from "run".
+    """
+    word = str(original_word).strip()
+    if match := re.fullmatch(r"(.*) \(([^()]*)\)(?: \d+)?", word):
+        word, pos = match.groups()
+        if pos == "verb" and word.startswith("to "):
+            word = word[len("to "):]
+    return word
+
+
 def process_entry(entry: dict):
     new_entry = {
         "Word": entry["processed_word"],
@@ -96,62 +127,85 @@ def process_entry(entry: dict):
     return new_entry
 
         
-def run_definitions():
-    df = pd.read_csv("webster_saved_words.csv")
+def export_deck(journal: Journal, save_csv: str, seed: Optional[int] = SHUFFLE_SEED):
+    webster_df = journal.frame(WEBSTER_COLS)
+    webster_df = webster_df.sample(frac=1, random_state=seed).reset_index(drop=True)
+    webster_df.to_csv(save_csv, index=None, header=None)
+
+
+def save_not_found(words: dict, path: str = "not_found_words.txt"):
+    """Merge `words` into `path`, keeping every word once."""
+    if not words:
+        return
     try:
-        webster_df = pd.read_csv(
-            "webster.csv",
-            index_col=False,
-            header=None,
-            names=["Word", "Picture", "Definition", "Audio",
-                   "Part of speech", "Sample sentence", "Original word"]
-        )
+        with open(path) as f:
+            saved = dict.fromkeys(line.strip() for line in f if line.strip())
     except FileNotFoundError:
-        webster_df = pd.DataFrame(
-            columns=["Word", "Picture", "Definition", "Audio",
-                     "Part of speech", "Sample sentence", "Original word"]
-        )
-    entries = webster_df.to_dict("records")
-    not_found_words = []
-    for ix, row in df.iterrows():
-        print(ix)
-        word = row.saved_words
-        if word in webster_df["Original word"].to_list():
-            continue
-        print(word)
-        # ee, _ = TwoEntries.webster(word)()
-        # if ee[0]:
-        ee = AllEntries.webster(word)()
-        if ee:
-            ee = [process_entry(x) for x in ee]
-            entries.extend(ee)
-        else:
-            breakpoint()
-            not_found_words.append(word)
-        if ix % 10 == 1:
-            with open("not_found_words.txt", "a") as f:
-                for w in not_found_words:
-                    f.write(f"{w}\n")
-            webster_df = pd.DataFrame(entries)
-            webster_df = webster_df.sample(frac=1).reset_index(drop=True)
-            webster_df.to_csv("webster.csv", index=None, header=None)
-    webster_df = pd.DataFrame(entries)
-
-    webster_df = webster_df.sample(frac=1).reset_index(drop=True)
-    webster_df.to_csv("webster.csv", index=None, header=None)
-
-
-def run(scrape=False):
+        saved = {}
+    saved.update(words)
+    with open(path, "w") as f:
+        for w in saved:
+            f.write(f"{w}\n")
+
+
+def run_definitions(save_csv: str = "webster.csv",
+                    seed: Optional[int] = SHUFFLE_SEED,
+                    trace: Optional[str] = None):
+    metrics.trace_to(trace)
+    df = pd.read_csv("webster_saved_words.csv")
+    not_found_words = {}
+    with Journal(Path(save_csv).with_suffix(".jsonl"),
+                 key=SAVED_WORD) as journal:
+        if not len(journal):
+            journal.import_csv(save_csv, WEBSTER_COLS,
+                               key=lambda x: saved_word(x["Original word"]))
+        try:
+            for ix, row in df.iterrows():
+                print(ix)
+                word = row.saved_words
+                if word in journal:
+                    continue
+                print(word)
+                # ee, _ = TwoEntries.webster(word)()
+                # if ee[0]:
+                ee = AllEntries.webster(word)()
+                if ee:
+                    journal.extend({**process_entry(x), SAVED_WORD: word}
+                                   for x in ee)
+                else:
+                    not_found_words[word] = None
+        finally:
+            export_deck(journal, save_csv, seed)
+            save_not_found(not_found_words)
+            metrics.export(str(Path(save_csv).with_suffix(".metrics")))
+            metrics.trace_to(None)
+    print(f"Response cache: {response_cache.stats()}")
+    print(f"Negative cache: {negative_cache.stats()}")
+    print(f"Stages:\n{metrics.summary()}")
+
+
+def run(scrape=False, trace=None):
     if scrape:
         run_scraper()
-    run_definitions()
+    run_definitions(trace=trace)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-s", "--scrape", action="store_true")
+    parser.add_argument("--trace", help="append per-word stage timings to this file")
+    parser.add_argument("--cassettes", choices=[RECORD, REPLAY],
+                        help="record provider traffic per word, or replay it offline")
+    parser.add_argument("--cassette-dir", default=CASSETTES_PATH, type=Path)
+    parser.add_argument("--latency", type=float, default=0,
+                        help="seconds added to every replayed response")
+    parser.add_argument("--latency-scale", type=float, default=0,
+                        help="replay this fraction of each recorded response time")
     args = parser.parse_args()
-    run(args.scrape)
+    if args.cassettes:
+        use_cassettes(args.cassettes, args.cassette_dir, args.latency,
+                      args.latency_scale)
+    run(args.scrape, args.trace)
 
 
     
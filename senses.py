@@ -0,0 +1,125 @@
+import math
+from typing import TYPE_CHECKING, Iterable, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Every column the providers emit.
+FIELDS = (
+    "headword", "hit", "entry", "lang", "pos", "pos_dst", "processed_word",
+    "n", "sense", "target", "target_desc", "flexion", "forms", "grammar_info",
+    "phonetics", "gender_src", "gender_dst", "examples_src", "examples_dst",
+    "synonyms", "audio_src", "audio_dst",
+)
+# Value of a column a sense doesn't have, like a NaN cell of the frame.
+NAN = math.nan
+
+
+def isnull(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class Sense():
+    """One sense of a lookup, a row of the provider frame.
+
+    Fields the lookup has no column for are unset, `get` returns the
+    default for them like `Series.get` does. Columns outside `FIELDS`, like
+    helper columns of a notebook frame, are kept in `extra`.
+    """
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, **fields):
+        extra = {}
+        for name, value in fields.items():
+            if name in FIELDS:
+                setattr(self, name, value)
+            else:
+                extra[name] = value
+        if extra:
+            self.extra = extra
+
+    def __getattr__(self, name: str):
+        # Only called for unset slots and unknown names.
+        if name != "extra" and hasattr(self, "extra") and name in self.extra:
+            return self.extra[name]
+        raise AttributeError(name)
+
+    def get(self, name: str, default=None):
+        return getattr(self, name, default)
+
+    def __getitem__(self, name: str):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def to_dict(self):
+        fields = {name: getattr(self, name) for name in FIELDS
+                  if hasattr(self, name)}
+        return {**fields, **getattr(self, "extra", {})}
+
+    def __repr__(self):
+        return f"Sense({self.to_dict()!r})"
+
+
+class Senses():
+    """Senses of a lookup in provider order, without pandas.
+
+    Providers emit them with `get_senses`, the entry layer reads them
+    instead of a DataFrame. `to_frame` gives the DataFrame view.
+    """
+    __slots__ = ("senses", "columns")
+
+    def __init__(self, senses: Iterable[Sense] = (), columns: Iterable[str] = ()):
+        self.senses = list(senses)
+        self.columns = tuple(columns)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]):
+        """Senses of record dicts, missing columns are NaN as in a frame."""
+        records = list(records)
+        columns = tuple(dict.fromkeys(name for record in records
+                                      for name in record))
+        return cls([Sense(**{name: record.get(name, NAN) for name in columns})
+                    for record in records], columns)
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame"):
+        return cls([Sense(**record) for record in df.to_dict("records")],
+                   df.columns)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame([sense.to_dict() for sense in self.senses],
+                            columns=list(self.columns))
+
+    @property
+    def empty(self):
+        return not self.senses
+
+    def __len__(self):
+        return len(self.senses)
+
+    def __iter__(self):
+        return iter(self.senses)
+
+    def __getitem__(self, ix: int):
+        return self.senses[ix]
+
+    def __repr__(self):
+        return f"Senses({len(self.senses)} senses, columns={list(self.columns)})"
+
+
+def lang_records(processed_entries: dict):
+    """Records of `{lang: {column: values}}`, each with its `lang`."""
+    for lang, columns in processed_entries.items():
+        for values in zip(*columns.values()):
+            yield dict(zip(columns, values), lang=lang)
+
+
+def as_senses(entries: Union["pd.DataFrame", Senses]):
+    """Senses of a provider frame, or `entries` if they already are."""
+    if isinstance(entries, Senses):
+        return entries
+    return Senses.from_frame(entries)
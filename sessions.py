@@ -0,0 +1,118 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from batch import rate_gate
+from cassettes import cassettes
+from deadline import DICT_TIMEOUT, request_timeout
+
+
+@dataclass
+class HostPolicy():
+    pool_size: int = 10
+    retries: int = 2
+    backoff: float = 0.3
+    # 503 is left out: PONS and Linguee use it to signal rate limiting,
+    # which the callers handle themselves.
+    retry_statuses: tuple = (429, 500, 502, 504)
+    timeout: float = DICT_TIMEOUT
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+DEFAULT_POLICY = HostPolicy()
+HOST_POLICIES = {
+    "api.pons.com": HostPolicy(pool_size=8),
+    "www.dictionaryapi.com": HostPolicy(pool_size=8),
+    "media.merriam-webster.com": HostPolicy(pool_size=8, timeout=10),
+    "linguee.com": HostPolicy(pool_size=4),
+    "127.0.0.1": HostPolicy(pool_size=8, retries=0),
+}
+
+
+class SessionRegistry():
+    """One keep-alive `requests.Session` per host.
+
+    Each session gets a connection pool, retry policy and default timeout
+    from `policies` (looked up by host, `default` otherwise), so repeated
+    requests to the same dictionary API or media host reuse connections.
+    `routes` sends requests for a host[:port] to another base URL instead,
+    e.g. a local stub server.
+    """
+
+    def __init__(self, policies: Dict[str, HostPolicy] = HOST_POLICIES,
+                 default: HostPolicy = DEFAULT_POLICY):
+        self.policies = dict(policies)
+        self.default = default
+        self.sessions = {}
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def policy(self, host: str):
+        """Policy of `host` or of the closest domain it belongs to."""
+        while host:
+            if (policy := self.policies.get(host)) is not None:
+                return policy
+            host = host.partition(".")[2]
+        return self.default
+
+    def _new_session(self, policy: HostPolicy):
+        retry = Retry(total=policy.retries, backoff_factor=policy.backoff,
+                      status_forcelist=policy.retry_statuses,
+                      allowed_methods=("GET", "HEAD"),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=policy.pool_size,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(policy.headers)
+        return session
+
+    def session(self, url: str):
+        host = urlsplit(url).hostname
+        with self._lock:
+            if (session := self.sessions.get(host)) is None:
+                session = self._new_session(self.policy(host))
+                self.sessions[host] = session
+            return session
+
+    def route(self, netloc: str, base_url: Optional[str]):
+        if base_url is None:
+            self.routes.pop(netloc, None)
+        else:
+            self.routes[netloc] = base_url.rstrip("/")
+
+    def resolve(self, url: str):
+        parts = urlsplit(url)
+        if base_url := self.routes.get(parts.netloc):
+            query = f"?{parts.query}" if parts.query else ""
+            return f"{base_url}{parts.path}{query}"
+        return url
+
+    def get(self, url: str, timeout: Optional[float] = None, **kwargs):
+        if timeout is None:
+            timeout = self.policy(urlsplit(url).hostname).timeout
+        if cassettes.active:
+            return cassettes.get(url, timeout, self._send, **kwargs)
+        return self._send(url, timeout, **kwargs)
+
+    def _send(self, url: str, timeout: float, **kwargs):
+        rate_gate()
+        url = self.resolve(url)
+        return self.session(url).get(url, timeout=request_timeout(timeout),
+                                     **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+session_registry = SessionRegistry()
@@ -1,39 +1,13 @@
-import errno
-import os
-import signal
-import functools
 import re
 from typing import List
-import requests
-import shutil
-from pathlib import Path
+from deadline import TimeoutError, timeout
+from sessions import session_registry
+from media_store import media_store
+from image_fetcher import image_fetcher
+import mw_markup
 
 
-from simple_image_download import simple_image_download as simp
-response = simp.simple_image_download
-
-
-class TimeoutError(Exception):
-    pass
-
-def timeout(seconds=10, error_message=os.strerror(errno.ETIME)):
-    def decorator(func):
-        def _handle_timeout(signum, frame):
-            raise TimeoutError(error_message)
-
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            signal.signal(signal.SIGALRM, _handle_timeout)
-            signal.alarm(seconds)
-            try:
-                result = func(*args, **kwargs)
-            finally:
-                signal.alarm(0)
-            return result
-
-        return wrapper
-
-    return decorator
+AUDIO_TIMEOUT = 10
 
 
 @timeout(15)
@@ -51,14 +25,9 @@ def downloadimages(query):
     query = query.split(",")[0].split("/")[0].split("[")[0].strip()
     # query = query.split(",")[0]
     print(query)
-    response().download(query, 10)
-    image = Path.cwd() / "simple_images" / query
-    files = list(image.glob("*"))
-    file = [x for x in files if x.stat().st_size > 10000][0]
-    for f in files:
-        if f != file:
-            f.unlink()
-    return file
+    if image := image_fetcher.fetch(query):
+        return image
+    raise FileNotFoundError(f"Couldn't find an image for: {query}")
 
 
 DER_DIE_DAS = {"masculine": "der",
@@ -163,16 +132,16 @@ def flexicon_processing(flexicon: str, lang: str, word: str):
     return flexicon_processor[lang](flexicon, word=word)
 
 
+@timeout(30)
 def get_audio(audio_url, word, collections_path):
-    r = requests.get(audio_url)
+    r = session_registry.get(audio_url, timeout=AUDIO_TIMEOUT)
     audio_name = f"{word}.mp3"
-    audio_save = f"audio/{word}.mp3"
-    open(audio_save, "wb").write(r.content)
-    shutil.copy(audio_save, collections_path / audio_name)
+    media_store.place_bytes(r.content, ".mp3", collections_path / audio_name)
     return f"[sound:{audio_name}]"
 
 
-del_italics = lambda x: x.replace("{it}", "").replace("{/it}", "")
+# Renders the rest of the MW markup too, the text is already in italics.
+del_italics = lambda x: mw_markup.render(x, italics=False)
 
 def get_sub(audio: str):
     if "gg" in audio[:2]:
@@ -1,10 +1,14 @@
-import re
-import requests
+import contextvars
 import json
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
 from dict_secrets import WEBSTER, THESAURUS
 from utils import del_italics, en_verb_processing, get_webster_audio
+from cache import response_cache
+from sessions import session_registry
+from metrics import metrics
+from senses import Senses
+import mw_markup
 
 class WebsterEntries():
     def __init__(self, word: str, *args, **kwargs):
@@ -15,29 +19,39 @@ class WebsterEntries():
         self.webster, self.thesarus = self.get_entries()
 
     def get_entries(self):
+        """Return the collegiate and thesaurus entries.
+
+        Both are needed: definitions come from the thesaurus when it has the
+        word, audio always comes from the collegiate entries. The two are
+        requested concurrently.
+        """
+        with ThreadPoolExecutor(1) as executor:
+            thesaurus = executor.submit(contextvars.copy_context().run,
+                                        self.get_thesaurus)
+            return self.get_webster(), thesaurus.result()
+
+    def get_webster(self):
         word_url = self.webster_url.format(word=self.original_word.replace(" ", "%20"),
                                            key=WEBSTER)
-        webster_entries = json.loads(requests.get(word_url).text)
+        return json.loads(self._fetch("webster", word_url))
+
+    def get_thesaurus(self):
         word_url = self.thesaurus_url.format(word=self.original_word.replace(" ", "%20"),
                                              key=THESAURUS)
-        thesaurus_entries = json.loads(requests.get(word_url).text)
-        return webster_entries, thesaurus_entries
+        return json.loads(self._fetch("thesaurus", word_url))
+
+    def _fetch(self, provider: str, url: str):
+        return response_cache.fetch(provider, self.original_word, "en-en",
+                                    lambda: self._request(url))
+
+    def _request(self, url: str):
+        response = session_registry.get(url)
+        response.raise_for_status()
+        return response
 
 
     def process_desc(self, desc):
-        pattern = re.compile(r"{dx_def}.+{/dx_def}")
-        if m := pattern.search(desc):
-            desc = desc.replace(m[0], "")
-        replace_d = {
-            "{wi}": "<i>",
-            "{/wi}": "</i>",
-            "{it}": "<i>",
-            "{/it}": "</i>",
-            "{bc}": "",
-        }
-        for k, v in replace_d.items():
-            desc = desc.replace(k, v)
-        return desc
+        return mw_markup.render(desc)
 
         
 
@@ -79,7 +93,7 @@ class WebsterEntries():
                     dt = sense["dt"]
                 else:
                     dt = dt["dt"]
-                desc = dt[0][-1]
+                desc = self.process_desc(dt[0][-1])
                 try:
                     example = f"<i> {dt[1][-1][0]['t'].replace(self.original_word, '_____')}</i>"
                 except (IndexError, KeyError, TypeError):
@@ -101,7 +115,6 @@ class WebsterEntries():
                 word = self.original_word
                 if fl == "verb":
                     word = en_verb_processing(word)
-                desc = self.process_desc(desc)
                 processed_word = f"{word} ({fl})"
                 if processed_word in processed_words:
                     n += 1
@@ -119,12 +132,16 @@ class WebsterEntries():
                 definitions.append(definition)
         return definitions
 
+    def get_senses(self):
+        with metrics.stage("parse", word=self.original_word, provider="webster"):
+            definitions = self.process_webster_entries(
+                thesaurus_entries=self.thesarus, webster_entries=self.webster
+            )
+        return Senses.from_records(definitions), None
+
     def get_df(self):
-        definitions = self.process_webster_entries(
-            thesaurus_entries=self.thesarus, webster_entries=self.webster
-        )
-        df = pd.DataFrame(definitions)
-        return df, None
+        senses, error = self.get_senses()
+        return senses.to_frame(), error
 
     def __call__(self):
         return self.get_df()